@@ -0,0 +1,95 @@
+"""
+  Threshold alerts over every region.
+
+  The rules are tested on the last weeks of the whole region x date matrix in one
+  vectorized pass. Only the regions that match are looked up and returned:
+
+    rules = [Rule("new", True, 100), Rule("doubling", False, 10)]
+    for alert in scan(store, rules, top=20):
+        ...
+
+  The alert metrics, all as of the last day:
+
+    new          new cases of the day
+    week         new cases of the last 7 days
+    week_growth  % growth of the new cases of the last 7 days over the 7 days before
+    doubling     days to double at the average daily growth of the last 7 days,
+                 NaN when the series did not grow
+"""
+import logging
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+import metrics
+import smoothing
+
+LOG = logging.getLogger(__name__)
+
+WEEK = 7
+
+ALERT_METRICS = ("new", "week", "week_growth", "doubling")
+
+
+class Rule(NamedTuple):
+    metric: str         # one of ALERT_METRICS
+    above: bool         # True: alert above the threshold, False: below
+    threshold: float
+
+    def test(self, values: np.ndarray) -> np.ndarray:
+        # NaN (no data) never alerts
+        with np.errstate(invalid='ignore'):
+            return values > self.threshold if self.above else values < self.threshold
+
+    def __str__(self) -> str:
+        return F"{self.metric} {'>' if self.above else '<'} {self.threshold:g}"
+
+
+def alertMetrics(confirmed: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    The alert metrics of every row of the cumulative confirmed matrix. Only the
+    last 2 weeks are read, the days before the first date count as 0
+    """
+    days = 2 * WEEK + 1
+    recent = np.asarray(confirmed[:, -days:], dtype=np.int64)
+    if recent.shape[1] < days:
+        recent = np.pad(recent, ((0, 0), (days - recent.shape[1], 0)))
+
+    week = recent[:, -1] - recent[:, -1 - WEEK]
+    previous = recent[:, -1 - WEEK] - recent[:, 0]
+    growth = smoothing.growthRate(recent[:, -1 - WEEK:], WEEK)[:, -1]
+    # a flat or declining (revised down) series never doubles
+    growth[~(growth > 0)] = np.nan
+    return {
+        "new": recent[:, -1] - recent[:, -2],
+        "week": week,
+        "week_growth": 100 * (np.divide(week, previous, out=np.full(len(week), np.nan), where=previous > 0) - 1),
+        "doubling": metrics.doublingDays(growth),
+    }
+
+
+def scan(store, rules: List[Rule], rows: Optional[np.ndarray] = None, end: Optional[int] = None,
+         matchAll: bool = False, top: int = 0) -> Iterator[dict]:
+    """
+    The regions of rows (all by default) matching any (or all) of the rules as of the
+    column end (the last date by default), as records. With top only the top regions
+    by new cases are returned, the most first.
+    """
+    confirmed = store.matrix("confirmed")
+    if end is not None:
+        confirmed = confirmed[:, :end]
+    m = alertMetrics(confirmed if rows is None else confirmed[rows])
+
+    hits = np.array([rule.test(m[rule.metric]) for rule in rules])
+    matched = np.flatnonzero(hits.all(axis=0) if matchAll else hits.any(axis=0))
+    matched = matched[metrics.topK(m["new"][matched], top)]
+
+    date = store.dates[(len(store.dates) if end is None else end) - 1]
+    regions = store.regions
+    for i in matched:
+        row = int(i if rows is None else rows[i])
+        region = regions[row]
+        yield {"region": region["name"], "country": region["country"], "province": region["province"],
+               "city": region["city"], "date": date,
+               **{name: m[name][i].item() for name in ALERT_METRICS},
+               "rules": [str(rule) for rule, hit in zip(rules, hits[:, i]) if hit]}
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+  Benchmarks of the process / report / ottawa hot paths on synthetic data.
+
+  Generates john hopkins format csv files (regions x days) and an Ottawa PHU
+  page (days), then times every stage separately:
+
+    ingest      read the confirmed and deaths csv files
+    rows        store every row and roll up the regions (processWorld)
+    write       write the processed database
+    read        open the database and load the confirmed and death matrices
+    table       build the report table
+    plot        render the report comparison plot and the region plots
+    ottawa      parse the Ottawa page
+
+  Each stage reports the median wall clock, the throughput and, unless --no-memory,
+  its peak python memory (tracemalloc). Results are json so runs can be diffed:
+
+    ./benchmark.py --regions 2000 --days 400 --out before.json
+    ./benchmark.py --regions 2000 --days 400 --baseline before.json
+"""
+import csv
+import datetime
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import typer                     # https://typer.tiangolo.com
+
+import ingest
+import processWorld
+import report
+import ottawa
+import storage
+from config import DbFormat
+from plots import doPlot
+from query import Store
+from registry import Registry
+
+LOG = logging.getLogger(__name__)
+
+app = typer.Typer()
+
+START_DATE = datetime.date(2020, 1, 22)
+
+
+def syntheticRegions(regions: int) -> List[Tuple[str, str]]:
+    """
+    (province, country) pairs mixing the layouts of the global file: countries with a
+    row of their own, countries reported only by provinces, US states and cities
+    """
+    result = []
+    for i in range(regions):
+        kind = i % 10
+        if kind < 6:
+            result.append(("", F"Country {i}"))
+        elif kind < 9:
+            result.append((F"Province {i}", F"Federation {i // 30}"))
+        else:
+            result.append((F"County {i}, S{i // 100}", "US"))
+    return result
+
+
+def syntheticSeries(rows: int, days: int, seed: int, scale: float = 1.0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.poisson(20 * scale, size=(rows, days)), axis=1)
+
+
+def writeJhuCsv(path: Path, regions: int, days: int, seed: int = 1, scale: float = 1.0) -> Path:
+    """
+    A john hopkins global time series csv of regions x days
+    """
+    dates = [START_DATE + datetime.timedelta(d) for d in range(days)]
+    header = ["Province/State", "Country/Region", "Lat", "Long"] + [F"{d.month}/{d.day}/{d.strftime('%y')}" for d in dates]
+    counts = syntheticSeries(regions, days, seed, scale)
+    with open(path, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(header)
+        for (province, country), row in zip(syntheticRegions(regions), counts.tolist()):
+            writer.writerow([province, country, "1.5", "2.5"] + row)
+    return path
+
+
+def writeOttawaHtml(path: Path, days: int, seed: int = 2) -> Path:
+    """
+    An Ottawa PHU page with the new and the total confirmed cases datatables
+    """
+    totals = syntheticSeries(1, days, seed)[0].tolist()
+    dates = [START_DATE + datetime.timedelta(d) for d in range(days)]
+
+    def table(values):
+        rows = "".join(F'<tr class="{"row" if i % 2 == 0 else "altrow"}"><td>{d.month}/{d.day}/{d.year}</td><td>{v}</td></tr>'
+                       for i, (d, v) in enumerate(zip(dates, values)))
+        return F'<table class="datatable"><tbody><tr class="titlerow"><td>Date</td><td>Count</td></tr>{rows}</tbody></table>'
+
+    new = [totals[0]] + [b - a for a, b in zip(totals, totals[1:])]
+    path.write_text(F"<html><body><p>Ottawa</p>{table(new)}{table(totals)}</body></html>")
+    return path
+
+
+def measure(fn: Callable, repeat: int, memory: bool) -> Tuple[object, Dict[str, float]]:
+    """
+    Median and min wall clock of repeat runs. The peak memory is measured on a separate
+    run since tracing slows the code down.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+
+    stats = {"seconds": statistics.median(times), "min_seconds": min(times)}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+
+def stages(workDir: Path, regions: int, days: int, plotCount: int) -> Dict[str, Tuple[Callable, int]]:
+    """
+    The stages in run order with the number of items each one processes. A stage
+    uses the result of the previous ones, which keep theirs in state.
+    """
+    confirmedPath = writeJhuCsv(workDir / "confirmed.csv", regions, days, seed=1)
+    deathPath = writeJhuCsv(workDir / "deaths.csv", regions, days, seed=3, scale=0.05)
+    ottawaPath = writeOttawaHtml(workDir / "ottawa.html", days)
+    dbDir = workDir / "db"
+    state = {}
+
+    def ingestStage():
+        state["confirmed"] = ingest.readTimeSeries(confirmedPath)
+        state["death"] = ingest.readTimeSeries(deathPath)
+
+    def rowsStage():
+        confirmed = state["confirmed"]
+        state["metadata"] = {"start": confirmed.dates[0], "end": confirmed.dates[-1], "dates": confirmed.dates}
+        processWorld.REGISTRY = Registry(len(confirmed.dates), capacity=len(confirmed))
+        processWorld.PLOTS = []
+        processWorld.TRACKER = None
+        processWorld.doRows(confirmed, state["death"])
+        processWorld.doRollups(confirmed, state["death"])
+
+    def writeStage():
+        storage.getBackend(DbFormat.npy, dbDir).writeFlat(state["metadata"], *processWorld.REGISTRY.flat())
+
+    def readStage():
+        store = Store.open(dbDir)
+        state["store"] = store
+        return int(np.asarray(store.matrix("confirmed")).sum() + np.asarray(store.matrix("death")).sum())
+
+    def tableStage():
+        return report.buildTable(state["store"], "Max", 3, 0)
+
+    def plotStage():
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        store = state["store"]
+        result = report.compareSeries(store, store.names(store.countries()[:5]))
+        fig = Figure(figsize=(9, 4))
+        FigureCanvasAgg(fig)
+        report.drawCompare(fig, store, result)
+        fig.savefig(BytesIO(), format="png", bbox_inches='tight')
+
+        plotDir = workDir / "plots"
+        plotDir.mkdir(exist_ok=True)
+        for job in processWorld.PLOTS[:plotCount - 1]:
+            doPlot(plotDir, job)
+
+    def ottawaStage():
+        return ottawa.parseOttawaData(ottawaPath)
+
+    return {
+        "ingest": (ingestStage, 2 * regions),
+        "rows": (rowsStage, regions),
+        "write": (writeStage, regions),
+        "read": (readStage, regions),
+        "table": (tableStage, regions),
+        "plot": (plotStage, plotCount),
+        "ottawa": (ottawaStage, days),
+    }
+
+
+@app.command()
+def main(regions: int = typer.Option(1000, help="Rows of the synthetic csv files"),
+         days: int = typer.Option(300, help="Days of the synthetic csv files and Ottawa page"),
+         repeat: int = typer.Option(3, help="Runs per stage, the median is reported"),
+         plots: int = typer.Option(10, help="Plots rendered by the plot stage"),
+         memory: bool = typer.Option(True, help="Measure the peak memory of every stage"),
+         out: Path = typer.Option(None, help="Write the results to this json file"),
+         baseline: Path = typer.Option(None, help="Results of a previous run to compare with")):
+    """
+    Time the processing stages on synthetic data and print the results as json
+    """
+    results = {
+        "params": {"regions": regions, "days": days, "repeat": repeat, "plots": plots},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()},
+        "stages": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (fn, items) in stages(Path(tmp), regions, days, plots).items():
+            LOG.info(F"Running {name}")
+            _, stats = measure(fn, repeat, memory)
+            stats["items"] = items
+            stats["items_per_second"] = items / stats["seconds"] if stats["seconds"] else None
+            results["stages"][name] = stats
+
+    if baseline:
+        previous = json.loads(baseline.read_text())["stages"]
+        for name, stats in results["stages"].items():
+            if name in previous and previous[name]["seconds"]:
+                stats["vs_baseline"] = stats["seconds"] / previous[name]["seconds"]
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if out:
+        out.write_text(text + "\n")
+    print(text)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s,%(msecs)d %(levelname)s: %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    app()
@@ -1,18 +1,82 @@
 from pathlib import Path
 import os
 from enum import Enum
+from typing import Optional
 
 
-ROOT = (Path(os.path.dirname(__file__)) / '..').resolve()
+# the data, db and plots directories. COVID_ROOT moves them, e.g. to a fixture (see startupBench.py)
+ROOT = Path(os.environ.get("COVID_ROOT", Path(os.path.dirname(__file__)) / '..')).resolve()
 INDATADIR = ROOT / "indata/"
 LOCAL_CONFIRMED = INDATADIR / "covid19_confirmed.csv"
 LOCAL_DEATHS = INDATADIR / "covid19_deaths.csv"
 LOCAL_RECOVERED = INDATADIR / "covid19_recovered.csv"
+LOCAL_US_CONFIRMED = INDATADIR / "covid19_confirmed_US.csv"
+LOCAL_US_DEATHS = INDATADIR / "covid19_deaths_US.csv"
 PLOT_DIR = ROOT / "plots"
 DB_DIR = ROOT / "db"
+PLOT_CACHE_DIR = ROOT / "cache" / "plots"
+PLOT_CACHE_SIZE = 256 * 1024 * 1024     # bytes of rendered pngs kept on disk
+
+class DbFormat(str, Enum):
+    npy="npy"
+    json="json"
+    sqlite="sqlite"
+
+# format written by world process. json is kept as an export format
+DB_FORMAT = DbFormat.npy
+
+# world process also keeps every vintage of the data in the sqlite history (see storage.SqliteBackend)
+HISTORY = False
+
+# windows, in days, of the rolling averages precomputed by world process
+ROLLING_WINDOWS = (7,)
+
+class Smoothing(str, Enum):
+    rolling="rolling"
+    centered="centered"
+    ewma="ewma"
+
+# --smooth of the report and ottawa commands: days of the window, see smoothing.py
+SMOOTH_WINDOW = 7
+
+class RegionLevel(str, Enum):
+    country="country"
+    province="province"
+    city="city"
+
+class SourceName(str, Enum):
+    jhuGlobal="jhu-global"
+    jhuUs="jhu-us"
+    ottawa="ottawa"
+
+# sources fetched by world load and merged by world process, see sources.py
+SOURCES = (SourceName.jhuGlobal,)
+
+# rows parsed at once when reading the time series csv files. None reads the whole file
+CSV_CHUNKSIZE = 10000
+# directory of memory-mapped count matrices for time series files larger than memory.
+# None reads the counts in memory
+CSV_SPILL_DIR: Optional[Path] = None
+
+# covid serve
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8000
+SERVE_PLOT_CACHE = 64       # number of rendered plots kept in memory
+
+# number of processes used to render plots during world process
+PLOT_WORKERS = os.cpu_count() or 1
+# world process --thumbnails: low resolution copies for web galleries, in PLOT_DIR/THUMBNAIL_DIR
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_DPI = 30
+
+# the john hopkins time series directory fetched by world load. COVID_JHU_URL points to a mirror
+JHU_URL = os.environ.get("COVID_JHU_URL", "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series")
 
 OTTAWA_URL = "https://www.ottawapublichealth.ca/en/reports-research-and-statistics/la-maladie-coronavirus-covid-19.aspx"
 OTTAWA_HTML_PATH = INDATADIR / "ottawa.html"
+# seconds before the fetched Ottawa page is revalidated with the website
+OTTAWA_TTL = 3600
+OTTAWA_TIMEOUT = 30
 
 class TabulateTableTypes(str, Enum):
     plain="plain"
@@ -35,3 +99,9 @@ class TabulateTableTypes(str, Enum):
     latex_raw="latex_raw"
     latex_booktabs="latex_booktabs"
     textile="textile"
+
+# report table output: the tabulate formats plus csv and jsonl for machine consumers
+TableFormat = Enum("TableFormat", {**{t.name: t.value for t in TabulateTableTypes}, "csv": "csv", "jsonl": "jsonl"}, type=str)
+
+# rows sampled to size the columns of a streamed table. Smaller tables are rendered by tabulate
+TABLE_SAMPLE_ROWS = 1000
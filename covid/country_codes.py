@@ -0,0 +1,234 @@
+# ISO 3166-1 alpha-2 and alpha-3 codes of the john hopkins country names (Kosovo has a user assigned code)
+country_codes = {
+    'Afghanistan': ('AF', 'AFG'),
+    'Albania': ('AL', 'ALB'),
+    'Algeria': ('DZ', 'DZA'),
+    'Andorra': ('AD', 'AND'),
+    'Angola': ('AO', 'AGO'),
+    'Antarctica': ('AQ', 'ATA'),
+    'Antigua and Barbuda': ('AG', 'ATG'),
+    'Argentina': ('AR', 'ARG'),
+    'Armenia': ('AM', 'ARM'),
+    'Australia': ('AU', 'AUS'),
+    'Austria': ('AT', 'AUT'),
+    'Azerbaijan': ('AZ', 'AZE'),
+    'Bahamas': ('BS', 'BHS'),
+    'Bahrain': ('BH', 'BHR'),
+    'Bangladesh': ('BD', 'BGD'),
+    'Barbados': ('BB', 'BRB'),
+    'Belarus': ('BY', 'BLR'),
+    'Belgium': ('BE', 'BEL'),
+    'Belize': ('BZ', 'BLZ'),
+    'Benin': ('BJ', 'BEN'),
+    'Bhutan': ('BT', 'BTN'),
+    'Bolivia': ('BO', 'BOL'),
+    'Bosnia and Herzegovina': ('BA', 'BIH'),
+    'Botswana': ('BW', 'BWA'),
+    'Brazil': ('BR', 'BRA'),
+    'Brunei': ('BN', 'BRN'),
+    'Bulgaria': ('BG', 'BGR'),
+    'Burkina Faso': ('BF', 'BFA'),
+    'Burma': ('MM', 'MMR'),
+    'Burundi': ('BI', 'BDI'),
+    'Cabo Verde': ('CV', 'CPV'),
+    'Cambodia': ('KH', 'KHM'),
+    'Cameroon': ('CM', 'CMR'),
+    'Canada': ('CA', 'CAN'),
+    'Central African Republic': ('CF', 'CAF'),
+    'Chad': ('TD', 'TCD'),
+    'Chile': ('CL', 'CHL'),
+    'China': ('CN', 'CHN'),
+    'Colombia': ('CO', 'COL'),
+    'Comoros': ('KM', 'COM'),
+    'Congo (Brazzaville)': ('CG', 'COG'),
+    'Congo (Kinshasa)': ('CD', 'COD'),
+    'Costa Rica': ('CR', 'CRI'),
+    "Cote d'Ivoire": ('CI', 'CIV'),
+    'Croatia': ('HR', 'HRV'),
+    'Cuba': ('CU', 'CUB'),
+    'Cyprus': ('CY', 'CYP'),
+    'Czechia': ('CZ', 'CZE'),
+    'Denmark': ('DK', 'DNK'),
+    'Djibouti': ('DJ', 'DJI'),
+    'Dominica': ('DM', 'DMA'),
+    'Dominican Republic': ('DO', 'DOM'),
+    'Ecuador': ('EC', 'ECU'),
+    'Egypt': ('EG', 'EGY'),
+    'El Salvador': ('SV', 'SLV'),
+    'Equatorial Guinea': ('GQ', 'GNQ'),
+    'Eritrea': ('ER', 'ERI'),
+    'Estonia': ('EE', 'EST'),
+    'Eswatini': ('SZ', 'SWZ'),
+    'Ethiopia': ('ET', 'ETH'),
+    'Fiji': ('FJ', 'FJI'),
+    'Finland': ('FI', 'FIN'),
+    'France': ('FR', 'FRA'),
+    'Gabon': ('GA', 'GAB'),
+    'Gambia': ('GM', 'GMB'),
+    'Georgia': ('GE', 'GEO'),
+    'Germany': ('DE', 'DEU'),
+    'Ghana': ('GH', 'GHA'),
+    'Greece': ('GR', 'GRC'),
+    'Grenada': ('GD', 'GRD'),
+    'Guatemala': ('GT', 'GTM'),
+    'Guinea': ('GN', 'GIN'),
+    'Guinea-Bissau': ('GW', 'GNB'),
+    'Guyana': ('GY', 'GUY'),
+    'Haiti': ('HT', 'HTI'),
+    'Holy See': ('VA', 'VAT'),
+    'Honduras': ('HN', 'HND'),
+    'Hungary': ('HU', 'HUN'),
+    'Iceland': ('IS', 'ISL'),
+    'India': ('IN', 'IND'),
+    'Indonesia': ('ID', 'IDN'),
+    'Iran': ('IR', 'IRN'),
+    'Iraq': ('IQ', 'IRQ'),
+    'Ireland': ('IE', 'IRL'),
+    'Israel': ('IL', 'ISR'),
+    'Italy': ('IT', 'ITA'),
+    'Jamaica': ('JM', 'JAM'),
+    'Japan': ('JP', 'JPN'),
+    'Jordan': ('JO', 'JOR'),
+    'Kazakhstan': ('KZ', 'KAZ'),
+    'Kenya': ('KE', 'KEN'),
+    'Kiribati': ('KI', 'KIR'),
+    'Korea, North': ('KP', 'PRK'),
+    'Korea, South': ('KR', 'KOR'),
+    'Kosovo': ('XK', 'XKX'),
+    'Kuwait': ('KW', 'KWT'),
+    'Kyrgyzstan': ('KG', 'KGZ'),
+    'Laos': ('LA', 'LAO'),
+    'Latvia': ('LV', 'LVA'),
+    'Lebanon': ('LB', 'LBN'),
+    'Lesotho': ('LS', 'LSO'),
+    'Liberia': ('LR', 'LBR'),
+    'Libya': ('LY', 'LBY'),
+    'Liechtenstein': ('LI', 'LIE'),
+    'Lithuania': ('LT', 'LTU'),
+    'Luxembourg': ('LU', 'LUX'),
+    'Madagascar': ('MG', 'MDG'),
+    'Malawi': ('MW', 'MWI'),
+    'Malaysia': ('MY', 'MYS'),
+    'Maldives': ('MV', 'MDV'),
+    'Mali': ('ML', 'MLI'),
+    'Malta': ('MT', 'MLT'),
+    'Marshall Islands': ('MH', 'MHL'),
+    'Mauritania': ('MR', 'MRT'),
+    'Mauritius': ('MU', 'MUS'),
+    'Mexico': ('MX', 'MEX'),
+    'Micronesia': ('FM', 'FSM'),
+    'Moldova': ('MD', 'MDA'),
+    'Monaco': ('MC', 'MCO'),
+    'Mongolia': ('MN', 'MNG'),
+    'Montenegro': ('ME', 'MNE'),
+    'Morocco': ('MA', 'MAR'),
+    'Mozambique': ('MZ', 'MOZ'),
+    'Namibia': ('NA', 'NAM'),
+    'Nauru': ('NR', 'NRU'),
+    'Nepal': ('NP', 'NPL'),
+    'Netherlands': ('NL', 'NLD'),
+    'New Zealand': ('NZ', 'NZL'),
+    'Nicaragua': ('NI', 'NIC'),
+    'Niger': ('NE', 'NER'),
+    'Nigeria': ('NG', 'NGA'),
+    'North Macedonia': ('MK', 'MKD'),
+    'Norway': ('NO', 'NOR'),
+    'Oman': ('OM', 'OMN'),
+    'Pakistan': ('PK', 'PAK'),
+    'Palau': ('PW', 'PLW'),
+    'Panama': ('PA', 'PAN'),
+    'Papua New Guinea': ('PG', 'PNG'),
+    'Paraguay': ('PY', 'PRY'),
+    'Peru': ('PE', 'PER'),
+    'Philippines': ('PH', 'PHL'),
+    'Poland': ('PL', 'POL'),
+    'Portugal': ('PT', 'PRT'),
+    'Qatar': ('QA', 'QAT'),
+    'Romania': ('RO', 'ROU'),
+    'Russia': ('RU', 'RUS'),
+    'Rwanda': ('RW', 'RWA'),
+    'Saint Kitts and Nevis': ('KN', 'KNA'),
+    'Saint Lucia': ('LC', 'LCA'),
+    'Saint Vincent and the Grenadines': ('VC', 'VCT'),
+    'Samoa': ('WS', 'WSM'),
+    'San Marino': ('SM', 'SMR'),
+    'Sao Tome and Principe': ('ST', 'STP'),
+    'Saudi Arabia': ('SA', 'SAU'),
+    'Senegal': ('SN', 'SEN'),
+    'Serbia': ('RS', 'SRB'),
+    'Seychelles': ('SC', 'SYC'),
+    'Sierra Leone': ('SL', 'SLE'),
+    'Singapore': ('SG', 'SGP'),
+    'Slovakia': ('SK', 'SVK'),
+    'Slovenia': ('SI', 'SVN'),
+    'Solomon Islands': ('SB', 'SLB'),
+    'Somalia': ('SO', 'SOM'),
+    'South Africa': ('ZA', 'ZAF'),
+    'South Sudan': ('SS', 'SSD'),
+    'Spain': ('ES', 'ESP'),
+    'Sri Lanka': ('LK', 'LKA'),
+    'Sudan': ('SD', 'SDN'),
+    'Suriname': ('SR', 'SUR'),
+    'Sweden': ('SE', 'SWE'),
+    'Switzerland': ('CH', 'CHE'),
+    'Syria': ('SY', 'SYR'),
+    'Taiwan*': ('TW', 'TWN'),
+    'Tajikistan': ('TJ', 'TJK'),
+    'Tanzania': ('TZ', 'TZA'),
+    'Thailand': ('TH', 'THA'),
+    'Timor-Leste': ('TL', 'TLS'),
+    'Togo': ('TG', 'TGO'),
+    'Tonga': ('TO', 'TON'),
+    'Trinidad and Tobago': ('TT', 'TTO'),
+    'Tunisia': ('TN', 'TUN'),
+    'Turkey': ('TR', 'TUR'),
+    'Tuvalu': ('TV', 'TUV'),
+    'US': ('US', 'USA'),
+    'Uganda': ('UG', 'UGA'),
+    'Ukraine': ('UA', 'UKR'),
+    'United Arab Emirates': ('AE', 'ARE'),
+    'United Kingdom': ('GB', 'GBR'),
+    'Uruguay': ('UY', 'URY'),
+    'Uzbekistan': ('UZ', 'UZB'),
+    'Vanuatu': ('VU', 'VUT'),
+    'Venezuela': ('VE', 'VEN'),
+    'Vietnam': ('VN', 'VNM'),
+    'West Bank and Gaza': ('PS', 'PSE'),
+    'Yemen': ('YE', 'YEM'),
+    'Zambia': ('ZM', 'ZMB'),
+    'Zimbabwe': ('ZW', 'ZWE'),
+}
+
+# other common names of the john hopkins countries, lower case
+country_aliases = {
+    'united states': 'US',
+    'united states of america': 'US',
+    'usa': 'US',
+    'america': 'US',
+    'south korea': 'Korea, South',
+    'korea': 'Korea, South',
+    'republic of korea': 'Korea, South',
+    'north korea': 'Korea, North',
+    'uk': 'United Kingdom',
+    'britain': 'United Kingdom',
+    'great britain': 'United Kingdom',
+    'czech republic': 'Czechia',
+    'ivory coast': "Cote d'Ivoire",
+    'myanmar': 'Burma',
+    'cape verde': 'Cabo Verde',
+    'swaziland': 'Eswatini',
+    'macedonia': 'North Macedonia',
+    'vatican': 'Holy See',
+    'vatican city': 'Holy See',
+    'east timor': 'Timor-Leste',
+    'palestine': 'West Bank and Gaza',
+    'drc': 'Congo (Kinshasa)',
+    'democratic republic of the congo': 'Congo (Kinshasa)',
+    'republic of the congo': 'Congo (Brazzaville)',
+    'russian federation': 'Russia',
+    'uae': 'United Arab Emirates',
+    'viet nam': 'Vietnam',
+    'holland': 'Netherlands',
+    'the bahamas': 'Bahamas',
+    'the gambia': 'Gambia',
+}
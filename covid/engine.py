@@ -0,0 +1,84 @@
+"""
+  Vectorized processing of the john hopkins time series.
+
+  The confirmed and deaths time series (see ingest) are aligned once by region key and every
+  series is computed as a 2-D array: one row per region, one column per date.
+"""
+import logging
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+import metrics
+from ingest import TimeSeries
+
+LOG = logging.getLogger(__name__)
+
+
+class Region(NamedTuple):
+    country: str
+    province: Optional[str]
+    city: Optional[str]
+    title: str
+
+
+def regionKey(province, country, city=None) -> Region:
+    """
+    Split a (province, country) pair from the csv into country / province / city.
+    The global files report US cities as "City, ST" in the province column, the
+    county files have the city in its own column.
+    """
+    if not isinstance(province, str):
+        return Region(country, None, None, country)
+
+    if isinstance(city, str):
+        return Region(country, province, city, F"{country}_{province}_{city}")
+
+    if province.find(",") == -1:
+        return Region(country, province, None, F"{country}_{province}")
+
+    city, province = province.split(",", 1)
+    return Region(country, province, city, F"{country}_{province}_{city}")
+
+
+def _cities(ts: TimeSeries):
+    return ts.cities if ts.cities is not None else [None] * len(ts)
+
+
+def regionKeys(ts: TimeSeries) -> List[Region]:
+    return [regionKey(province, country, city) for province, country, city in zip(ts.provinces, ts.countries, _cities(ts))]
+
+
+def alignRows(confirmed: TimeSeries, death: TimeSeries) -> np.ndarray:
+    """
+    For every row of confirmed return the index of the matching row in death or -1.
+
+    A row with a province matches on (country, province, city). A country only row
+    matches the first death row of that country, which is what the per row filtering did.
+    """
+    byProvince = {}
+    byCountry = {}
+    for i, (province, country, city) in enumerate(zip(death.provinces, death.countries, _cities(death))):
+        byCountry.setdefault(country, i)
+        if isinstance(province, str):
+            byProvince.setdefault((country, province, city), i)
+
+    index = np.full(len(confirmed), -1, dtype=np.int64)
+    for i, (province, country, city) in enumerate(zip(confirmed.provinces, confirmed.countries, _cities(confirmed))):
+        if isinstance(province, str):
+            index[i] = byProvince.get((country, province, city), -1)
+        else:
+            index[i] = byCountry.get(country, -1)
+    return index
+
+
+def computeMatrix(data: np.ndarray):
+    """
+    Compute the daily difference and the percentage growth for every row of data.
+    Growth follows metrics.percentGrowth, 0 where it is undefined.
+    """
+    data = np.atleast_2d(data)
+    diff = np.diff(data, 1, axis=1)
+    percent = np.nan_to_num(metrics.percentGrowth(data))
+
+    return data, diff, percent
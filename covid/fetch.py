@@ -0,0 +1,111 @@
+"""
+  Conditional, concurrent http fetching.
+
+  Every downloaded file keeps a sidecar <file>.meta with the ETag and
+  Last-Modified returned by the server. The next fetch sends them back as
+  If-None-Match / If-Modified-Since so an unchanged file costs a 304.
+  Downloads go to a temporary file in the same directory and are renamed into
+  place, so a failed fetch leaves the previous good copy untouched.
+"""
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+import requests
+
+LOG = logging.getLogger(__name__)
+
+TIMEOUT = 60
+CHUNK_SIZE = 1 << 16
+
+
+class Status(str, Enum):
+    downloaded = "downloaded"
+    notModified = "not-modified"
+    failed = "failed"
+
+
+class FetchResult(NamedTuple):
+    url: str
+    path: Path
+    status: Status
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status != Status.failed
+
+
+def metaPath(path: Path) -> Path:
+    return path.with_name(path.name + ".meta")
+
+
+def _loadMeta(path: Path) -> dict:
+    try:
+        with open(metaPath(path), "r") as metafile:
+            return json.load(metafile)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomicWrite(path: Path, chunks) -> None:
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=F".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            for chunk in chunks:
+                outfile.write(chunk)
+        os.replace(tmp, str(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def fetch(url: str, path: Path, timeout: float = TIMEOUT, session: Optional[requests.Session] = None) -> FetchResult:
+    """
+    Fetch url into path unless the server reports the cached copy is still current
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    session = session or requests.Session()
+
+    headers = {}
+    meta = _loadMeta(path) if path.exists() else {}
+    if meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304:
+                LOG.debug(F"Not modified: {url}")
+                return FetchResult(url, path, Status.notModified)
+
+            response.raise_for_status()
+            _atomicWrite(path, response.iter_content(CHUNK_SIZE))
+
+            meta = {"url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")}
+            _atomicWrite(metaPath(path), [json.dumps(meta).encode()])
+    except Exception as x:
+        LOG.warning(F"Failed to fetch {url}, keeping the previous copy: {x}")
+        return FetchResult(url, path, Status.failed, str(x))
+
+    LOG.debug(F"Downloaded {url} to {path}")
+    return FetchResult(url, path, Status.downloaded)
+
+
+def fetchAll(jobs: List[Tuple[str, Path]], timeout: float = TIMEOUT, workers: Optional[int] = None) -> List[FetchResult]:
+    """
+    Fetch every (url, path) concurrently. Results are returned in the order of jobs
+    """
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(jobs)) as pool:
+        return list(pool.map(lambda job: fetch(job[0], job[1], timeout), jobs))
@@ -2,13 +2,14 @@
 
 # source https://github.com/CSSEGISandData/COVID-19/tree/master/csse_covid_19_data/csse_covid_19_time_series
 
-import wget
-import shutil
 from pathlib import Path
+from typing import List, Tuple
 import logging
+import fetch
+import profiling
 
 
-from config import INDATADIR, LOCAL_CONFIRMED, LOCAL_DEATHS
+from config import INDATADIR, JHU_URL, LOCAL_CONFIRMED, LOCAL_DEATHS, LOCAL_US_CONFIRMED, LOCAL_US_DEATHS
 
 LOG = logging.getLogger(__name__)
 
@@ -20,21 +21,29 @@ INDATADIR = INDATADIR.resolve()
 #URL_DEATHS    = "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/time_series_19-covid-Deaths.csv"
 #URL_RECOVERED = "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/time_series_19-covid-Recovered.csv"
 
-URL_CONFIRMED = "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv"
-URL_DEATHS    = "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv"
+URL_CONFIRMED = F"{JHU_URL}/time_series_covid19_confirmed_global.csv"
+URL_DEATHS    = F"{JHU_URL}/time_series_covid19_deaths_global.csv"
 #URL_RECOVERED = "https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/time_series_19-covid-Recovered.csv"
 
 
-def get() ->bool:
+URL_US_CONFIRMED = F"{JHU_URL}/time_series_covid19_confirmed_US.csv"
+URL_US_DEATHS    = F"{JHU_URL}/time_series_covid19_deaths_US.csv"
+
+
+DOWNLOADS = [(URL_CONFIRMED, LOCAL_CONFIRMED), (URL_DEATHS, LOCAL_DEATHS)]
+US_DOWNLOADS = [(URL_US_CONFIRMED, LOCAL_US_CONFIRMED), (URL_US_DEATHS, LOCAL_US_DEATHS)]
+
+
+def get(downloads: List[Tuple[str, Path]] = None) ->bool:
     try:
-        if INDATADIR.exists():
-            shutil.rmtree(str(INDATADIR))
         INDATADIR.mkdir(parents=True, exist_ok=True)
 
-        wget.download(URL_CONFIRMED, out=str(LOCAL_CONFIRMED))
-        wget.download(URL_DEATHS, out=str(LOCAL_DEATHS))
-        #wget.download(URL_RECOVERED, out=str(LOCAL_RECOVERED))
-        return True
+        with profiling.span("fetch"):
+            results = fetch.fetchAll(downloads or DOWNLOADS)
+        for result in results:
+            LOG.info(F"{result.status.value}: {result.url}")
+            profiling.count(F"fetch_{result.status.value}")
+        return all(result.ok for result in results)
     except Exception as x:
         LOG.exception(x)
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,108 @@
+"""
+  Per region fingerprints used to process only the regions whose series changed.
+
+  For every region we keep the number of dates and a hash of its confirmed and
+  death series. On the next run the new series is compared against the stored
+  fingerprint over the old length: a match with more dates means the source only
+  appended columns, a mismatch means the history was revised.
+
+  Unchanged regions are neither recomputed nor replotted. Appended and revised
+  regions are both replotted: a plot shows the whole series up to the last date.
+  Their stored series differ in the write, where the npy store keeps the derived
+  series of an appended region and only computes its new dates (see
+  storage.withDerived).
+"""
+import hashlib
+import json
+import logging
+from collections import Counter
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+
+class Change(str, Enum):
+    new = "new"
+    unchanged = "unchanged"
+    appended = "appended"
+    revised = "revised"
+
+
+def fingerprint(confirmed: np.ndarray, death: np.ndarray, length: Optional[int] = None) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(confirmed[:length], dtype=np.int32).tobytes())
+    h.update(np.ascontiguousarray(death[:length], dtype=np.int32).tobytes())
+    return h.hexdigest()
+
+
+def classify(previous: Optional[dict], confirmed: np.ndarray, death: np.ndarray) -> Change:
+    if previous is None:
+        return Change.new
+
+    length = previous["n"]
+    if len(confirmed) < length or fingerprint(confirmed, death, length) != previous["hash"]:
+        return Change.revised
+    if len(confirmed) == length:
+        return Change.unchanged
+    return Change.appended
+
+
+class Tracker:
+    """
+    Collects the fingerprints of the current run and classifies every region
+    against the fingerprints saved by the previous run.
+    """
+
+    def __init__(self, path: Path, dates: List[str], full: bool = False):
+        self.path = path
+        self.dates = dates
+        self.previous: Dict[str, dict] = {}
+        self.current: Dict[str, dict] = {}
+        self.counts = Counter()
+
+        if not full:
+            self.previous = self._load(path, dates)
+
+    @staticmethod
+    def _load(path: Path, dates: List[str]) -> Dict[str, dict]:
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r") as infile:
+                saved = json.load(infile)
+        except Exception as x:
+            LOG.warning(F"Ignoring unreadable fingerprints {path}: {x}")
+            return {}
+
+        # a date axis that is not a prefix of the new one invalidates everything
+        previousDates = saved.get("dates", [])
+        if previousDates != dates[:len(previousDates)]:
+            LOG.info("Date axis changed: reprocessing all regions")
+            return {}
+        return saved.get("regions", {})
+
+    def update(self, key: str, confirmed: np.ndarray, death: np.ndarray) -> bool:
+        """
+        Record the fingerprint of a region and return True if it needs to be recomputed.
+        """
+        change = classify(self.previous.get(key), confirmed, death)
+        self.counts[change] += 1
+        self.current[key] = {"n": len(confirmed), "hash": fingerprint(confirmed, death)}
+        return change != Change.unchanged
+
+    @property
+    def changed(self) -> bool:
+        return any(self.counts[c] for c in (Change.new, Change.appended, Change.revised)) or \
+               len(self.current) != len(self.previous)
+
+    def summary(self) -> str:
+        return ', '.join(F"{c.value}: {self.counts[c]}" for c in Change)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as outfile:
+            json.dump({"dates": self.dates, "regions": self.current}, outfile)
@@ -0,0 +1,161 @@
+"""
+  Ingestion of the john hopkins wide time series csv files.
+
+  Works for both the global files (Province/State, Country/Region, Lat, Long)
+  and the US county files (UID, ..., Admin2, Province_State, Country_Region,
+  Lat, Long_, ...). Columns are read with declared dtypes: category for the
+  names, float32 for lat/long and int32 for the daily counts. Other columns
+  are skipped.
+
+  With a chunksize the file is read chunk by chunk into a preallocated int32
+  matrix, so peak memory is the result plus one chunk. With a spill file the
+  matrix is a np.memmap on disk (see config.CSV_SPILL_DIR) for files larger
+  than memory.
+"""
+import datetime
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LOG = logging.getLogger(__name__)
+
+PROVINCE_COLS = ('Province/State', 'Province_State')
+COUNTRY_COLS  = ('Country/Region', 'Country_Region')
+CITY_COLS     = ('Admin2',)
+LAT_COLS      = ('Lat',)
+LONG_COLS     = ('Long', 'Long_')
+
+DATE_FORMAT = '%m/%d/%y'
+
+
+class TimeSeries(NamedTuple):
+    countries: np.ndarray
+    provinces: np.ndarray
+    cities: Optional[np.ndarray]
+    lat: np.ndarray
+    lon: np.ndarray
+    counts: np.ndarray          # int32, region x date
+    columns: List[str]          # the date columns as they appear in the file
+    dates: List[str]            # the same dates as YYYY-MM-DD
+
+    def __len__(self):
+        return len(self.countries)
+
+
+def _isDate(column: str) -> bool:
+    try:
+        datetime.datetime.strptime(column, DATE_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def _pick(columns: List[str], candidates) -> Optional[str]:
+    return next((c for c in candidates if c in columns), None)
+
+
+def _countRows(path: Path) -> int:
+    with open(path, "rb") as infile:
+        lines = sum(block.count(b"\n") for block in iter(lambda: infile.read(1 << 20), b""))
+    return max(lines - 1, 0)
+
+
+def _names(series: "pd.Series") -> np.ndarray:
+    return series.astype(object).to_numpy()
+
+
+def _allocate(rows: int, columns: int, spill: Optional[Path]) -> np.ndarray:
+    """
+    The int32 count matrix, a raw memory-mapped file when spilling. Growing it
+    again (more rows) keeps the counts already written and stays on disk.
+    """
+    if spill is None or rows * columns == 0:
+        return np.empty((rows, columns), dtype=np.int32)
+    # r+ extends the existing file to the new shape, w+ creates it
+    mode = 'r+' if spill.exists() and spill.stat().st_size > 0 else 'w+'
+    return np.memmap(str(spill), dtype=np.int32, mode=mode, shape=(rows, columns))
+
+
+def readTimeSeries(path: Path, chunksize: Optional[int] = None, spill: Optional[Path] = None) -> TimeSeries:
+    """
+    Read a JHU time series file. chunksize bounds the number of rows parsed at
+    once, spill puts the count matrix in a memory-mapped file instead of RAM.
+    """
+    try:
+        return _read(path, chunksize, spill, np.int32)
+    except ValueError as x:
+        # a count column with missing values can't be parsed as int32. The nullable
+        # Int64 keeps every count exact, float32 would round those above 2**24
+        LOG.warning(F"{path} has missing counts, reading them as 0: {x}")
+        return _read(path, chunksize, spill, "Int64")
+
+
+def _read(path: Path, chunksize: Optional[int], spill: Optional[Path], countType) -> TimeSeries:
+    # pandas is only imported to parse, world load fetches without it
+    import pandas as pd
+
+    if spill is not None and spill.exists():
+        # left by a previous read
+        spill.unlink()
+    header = list(pd.read_csv(path, nrows=0).columns)
+
+    country = _pick(header, COUNTRY_COLS)
+    province = _pick(header, PROVINCE_COLS)
+    city = _pick(header, CITY_COLS)
+    lat = _pick(header, LAT_COLS)
+    lon = _pick(header, LONG_COLS)
+    if country is None or province is None:
+        raise ValueError(F"{path} is not a JHU time series file")
+
+    columns = [c for c in header if _isDate(c)]
+    dates = [datetime.datetime.strptime(c, DATE_FORMAT).strftime("%Y-%m-%d") for c in columns]
+
+    names = [c for c in (province, country, city) if c is not None]
+    coords = [c for c in (lat, lon) if c is not None]
+    dtype = {**{c: 'category' for c in names}, **{c: np.float32 for c in coords}, **{c: countType for c in columns}}
+    usecols = names + coords + columns
+
+    if chunksize is None:
+        chunks = [pd.read_csv(path, usecols=usecols, dtype=dtype)]
+        rows = len(chunks[0])
+    else:
+        chunks = pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+        rows = _countRows(path)
+
+    counts = _allocate(rows, len(columns), spill)
+
+    parts = {c: [] for c in names + coords}
+    filled = 0
+    for chunk in chunks:
+        n = len(chunk)
+        if filled + n > counts.shape[0]:
+            # quoted newlines made the row count low: grow the matrix, on disk when spilling
+            if isinstance(counts, np.memmap):
+                counts.flush()
+                counts = _allocate(filled + n, len(columns), spill)
+            else:
+                counts = np.concatenate([counts, np.empty((filled + n - counts.shape[0], len(columns)), dtype=np.int32)])
+        counts[filled:filled + n] = chunk[columns].fillna(0).to_numpy(dtype=np.int32) if countType != np.int32 \
+            else chunk[columns].to_numpy(dtype=np.int32)
+        filled += n
+        for c in names:
+            parts[c].append(_names(chunk[c]))
+        for c in coords:
+            parts[c].append(chunk[c].to_numpy())
+
+    counts = counts[:filled]
+    LOG.debug(F"Read {filled} rows x {len(columns)} dates from {path}")
+
+    def joined(column, dtype=object):
+        if column is None:
+            return np.zeros(filled, dtype=dtype) if dtype != object else None
+        return np.concatenate(parts[column]) if parts[column] else np.empty(0, dtype=dtype)
+
+    return TimeSeries(countries=joined(country), provinces=joined(province), cities=joined(city),
+                      lat=joined(lat, np.float32), lon=joined(lon, np.float32),
+                      counts=counts, columns=columns, dates=dates)
@@ -0,0 +1,135 @@
+"""
+  Vectorized metrics over region x date matrices.
+
+  Every function takes whole matrices (one row per region) and computes the
+  metric for all regions at once.
+"""
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+# rollingMean moved to smoothing, kept importable from here
+from smoothing import rollingMean
+
+LOG = logging.getLogger(__name__)
+
+LOG2 = np.log(2)
+
+
+def percentGrowth(cases: np.ndarray) -> np.ndarray:
+    """
+    Day over day growth in percent of the previous day. NaN where the previous day is 0
+    """
+    cases = np.asarray(cases, dtype=np.float64)
+    diff = np.diff(cases, axis=-1)
+    previous = cases[..., :-1]
+    return 100 * np.divide(diff, previous, out=np.full(diff.shape, np.nan), where=previous != 0)
+
+
+def doublingDays(percent: np.ndarray) -> np.ndarray:
+    """
+    Days to double at a constant growth rate. NaN for no growth or an undefined rate
+    """
+    percent = np.asarray(percent, dtype=np.float64)
+    growth = 1 + percent / 100.0
+    valid = (percent != 0) & (growth > 0) & ~np.isnan(percent)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, LOG2 / np.log(np.where(valid, growth, 2.0)), np.nan)
+
+
+def newCases(cumulative: np.ndarray) -> np.ndarray:
+    """
+    Daily new cases aligned with the dates: the first day has 0 new cases
+    """
+    cumulative = np.asarray(cumulative)
+    result = np.zeros(cumulative.shape, dtype=cumulative.dtype)
+    result[..., 1:] = np.diff(cumulative, axis=-1)
+    return result
+
+
+def growthSeries(cumulative: np.ndarray) -> np.ndarray:
+    """
+    percentGrowth aligned with the dates: NaN for the first day
+    """
+    cumulative = np.asarray(cumulative)
+    result = np.full(cumulative.shape, np.nan)
+    result[..., 1:] = percentGrowth(cumulative)
+    return result
+
+
+def firstNonZero(values: np.ndarray) -> np.ndarray:
+    """
+    Offset of the first non zero day of every row, -1 for a row that is all zero
+    """
+    nonzero = np.asarray(values) > 0
+    return np.where(nonzero.any(axis=-1), np.argmax(nonzero, axis=-1), -1).astype(np.int32)
+
+
+def derived(cumulative: np.ndarray, name: str, windows=()) -> Dict[str, np.ndarray]:
+    """
+    The derived series of a cumulative metric, all region x date:
+    <name>_new, <name>_growth, <name>_doubling and <name>_new_avg<window>,
+    and per region <name>_first: the offset of the first non zero day
+    """
+    new = newCases(cumulative)
+    growth = growthSeries(cumulative)
+    result = {
+        F"{name}_new": new.astype(np.int32),
+        F"{name}_growth": growth.astype(np.float32),
+        F"{name}_doubling": doublingDays(growth).astype(np.float32),
+        F"{name}_first": firstNonZero(cumulative),
+    }
+    for window in windows:
+        result[F"{name}_new_avg{window}"] = rollingMean(new, window).astype(np.float32)
+    return result
+
+
+def tableMetrics(confirmed: np.ndarray, death: np.ndarray, days: int,
+                 growth: Optional[np.ndarray] = None, doubling: Optional[np.ndarray] = None,
+                 new: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute the report table columns for every region: max, max day (1 based),
+    today, deaths, % deaths and over the last days: cases, new cases, % growth and
+    doubling days. The precomputed (or smoothed) new, growth and doubling series are
+    used when given.
+    """
+    confirmed = np.asarray(confirmed)
+    death = np.asarray(death)
+
+    today = confirmed[:, -1].astype(np.int64)
+    deaths = death[:, -1].astype(np.int64)
+    maxIndex = np.argmax(confirmed, axis=1)
+
+    cases = confirmed[:, -days:].astype(np.int64)
+    start = confirmed.shape[1] - cases.shape[1] + 1
+    percent = percentGrowth(cases) if growth is None else np.asarray(growth[:, start:], dtype=np.float64)
+
+    return {
+        "max": confirmed[np.arange(len(confirmed)), maxIndex].astype(np.int64),
+        "maxDay": maxIndex + 1,
+        "today": today,
+        "deaths": deaths,
+        "percentDeaths": 100 * np.divide(deaths, today, out=np.full(len(today), np.nan), where=today != 0),
+        "cases": cases,
+        "diff": np.diff(cases, axis=1) if new is None else np.asarray(new[:, start:]),
+        "percent": percent,
+        "doubling": doublingDays(percent) if doubling is None else np.asarray(doubling[:, start:], dtype=np.float64),
+    }
+
+
+def topK(key: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the k largest keys in descending order, ties kept in index order.
+    NaN sorts last. With k None or 0 every index is returned.
+    """
+    key = np.where(np.isnan(key), -np.inf, key) if key.dtype.kind == 'f' else key
+    negated = -key.astype(np.float64)
+
+    if not k or k >= len(key):
+        return np.argsort(negated, kind='stable')
+
+    # partition to find the k-th key then sort only the candidates, ties included
+    kth = np.partition(negated, k - 1)[k - 1]
+    candidates = np.flatnonzero(negated <= kth)
+    return candidates[np.argsort(negated[candidates], kind='stable')][:k]
@@ -1,51 +1,73 @@
 #!/usr/bin/env python3
 
-from bs4 import BeautifulSoup, Tag  #https://www.crummy.com/software/BeautifulSoup/bs4/doc/
 import datetime
+import hashlib
+import importlib.util
 import itertools
 
 import logging
 import math
-import matplotlib.pyplot as plt
-import pandas as pd
-from pandas import Series
 from pathlib import Path
 
-import requests
+import os
 import sys
+import time
 import typer                     # https://typer.tiangolo.com
-from typing import Optional, List
-from tabulate import tabulate, tabulate_formats
+from typing import Optional, List, Tuple
 import click_spinner
+import profiling
 
-from config import OTTAWA_URL, OTTAWA_HTML_PATH, TabulateTableTypes
+from config import OTTAWA_URL, OTTAWA_HTML_PATH, OTTAWA_TTL, OTTAWA_TIMEOUT, DB_DIR, SMOOTH_WINDOW, Smoothing, TabulateTableTypes
+
+# bs4, numpy, matplotlib, tabulate and requests (fetch) are imported where they are used so the CLI starts fast
 
 LOG = logging.getLogger(__name__)
 
 app = typer.Typer()
 
-def getOttawaData(OTTAWA_HTML_PATH : Path) ->Optional[str]:
+OTTAWA_STORE = "ottawa"
+
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+def getOttawaData(OTTAWA_HTML_PATH : Path, ttl: float = OTTAWA_TTL) ->Optional[Path]:
+    """
+    Return the path of the Ottawa page, fetching it only when the local copy is older than ttl
+    seconds. The fetch is conditional so an unchanged page costs a 304.
+    """
+    if OTTAWA_HTML_PATH.exists() and time.time() - OTTAWA_HTML_PATH.stat().st_mtime < ttl:
+        LOG.debug(F"Using cached Ottawa HTML page {OTTAWA_HTML_PATH}")
+        return OTTAWA_HTML_PATH
+
+    import fetch
 
     LOG.debug(F"Fetching Ottawa HTML page @ {OTTAWA_URL}")
-    # TODO put a timeout on the get
-    response = requests.get(OTTAWA_URL)
-    if response.status_code != 200:
-        LOG.warning(F"Error {response.status_code} while fetching: {response.url}")
-        return None
-
-    try:
-        LOG.debug(F"Saving fetched data to disk at: {OTTAWA_HTML_PATH}")
-        with open(str(OTTAWA_HTML_PATH), "w") as outfile:
-            outfile.write(response.text)
-    except Exception as x:
-        LOG.warning(F"Failed to save html data to disk at: {OTTAWA_HTML_PATH}. Error: {x}")
-        return None
-
-    LOG.debug(F"Fetched Ottawa raw data from: {OTTAWA_URL}")
+    result = fetch.fetch(OTTAWA_URL, OTTAWA_HTML_PATH, timeout=OTTAWA_TIMEOUT)
+    if not result.ok:
+        LOG.warning(F"Error {result.error} while fetching: {OTTAWA_URL}")
+        return OTTAWA_HTML_PATH if OTTAWA_HTML_PATH.exists() else None
+
+    if result.status == fetch.Status.notModified:
+        # restart the ttl of the copy we have
+        os.utime(str(OTTAWA_HTML_PATH))
+
+    LOG.debug(F"Fetched Ottawa raw data from: {OTTAWA_URL} ({result.status.value})")
 
     return OTTAWA_HTML_PATH
 
-def parseTable(table: Tag ):
+def ensureOttawaData() -> None:
+    """
+    Fetch the Ottawa page if needed. Called by the commands, not the callback, so --help stays offline
+    """
+    if SKIP_FETCHING_HTML:
+        return
+    typer.echo("Loading data from website...  ",nl=False)
+    with click_spinner.spinner():
+        ottawaPath = getOttawaData(OTTAWA_HTML_PATH, 0 if REFRESH else OTTAWA_TTL)
+    typer.echo("     DONE")
+    if ottawaPath is None:
+        raise typer.Exit(1)
+
+def parseTable(table: "Tag" ):
     #print(table)
     data = []
     table_body = table.find('tbody')
@@ -59,49 +81,111 @@ def parseTable(table: Tag ):
     return data
 
 
-def parseOttawaData(ottawaPath : Path):
+def parseOttawaSeries(ottawaPath : Path) -> Tuple[List[str], List[int]]:
+    from bs4 import BeautifulSoup, SoupStrainer  #https://www.crummy.com/software/BeautifulSoup/bs4/doc/
+
+    # only the data tables are parsed, with lxml when it is installed
     with open(ottawaPath) as fp:
-        soup = BeautifulSoup(fp, 'html.parser')
+        soup = BeautifulSoup(fp, HTML_PARSER, parse_only=SoupStrainer('table', attrs={'class': 'datatable'}))
 
     tables = soup.find_all('table', attrs={'class': 'datatable'})
     newConfirmedRaw = parseTable(tables[0])
     totalConfirmedRaw = parseTable(tables[1])
 
-    result = []
-    previousValue = None
+    dates = []
+    totals = []
     for r in totalConfirmedRaw:
         dt = datetime.datetime.strptime(r[0], '%m/%d/%Y')
-        d = F"{dt.year}-{dt.month:02}-{dt.day:02}"
-        v = int(r[1])
-        if previousValue is not None:
-            diff = v - previousValue
-        else:
-            diff = 0
-
-        previousValue = v
-        percentage = 0
-        daysToDouble = 99.9  # use this for infinite
-        try:
-            percentage = 100.00*(diff/v)
-            #daysToDouble = math.log10(2)/math.log10(1+percentage/100.0)
-        except Exception:
-           pass
-        try:
-            daysToDouble = round(math.log10(2) / math.log10(1 + percentage / 100.0))
-        except Exception:
-            pass
+        dates.append(F"{dt.year}-{dt.month:02}-{dt.day:02}")
+        totals.append(int(r[1]))
+    return dates, totals
+
+
+def htmlHash(ottawaPath: Path) -> str:
+    with open(ottawaPath, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def saveOttawaStore(dates: List[str], totals: List[int], sourceHash: str = None) -> None:
+    import numpy as np
+    import storage
+
+    metadata = {'start': dates[0], "end": dates[-1], "dates": dates, "source_hash": sourceHash}
+    regions = [{"country": "Canada", "province": "Ontario", "city": "Ottawa", "name": "Ottawa"}]
+    series = storage.withDerived({"confirmed": np.array([totals], dtype=np.int32)})
+    storage.writeColumnar(DB_DIR / OTTAWA_STORE, metadata, regions, series)
+
+
+def loadOttawaData():
+    """
+    Read the Ottawa series through the query API. The store is keyed by the hash of the
+    fetched html, which is parsed again only when its content changed.
+    """
+    from query import Store
+
+    store = Store.open(DB_DIR, OTTAWA_STORE)
+    sourceHash = htmlHash(OTTAWA_HTML_PATH) if OTTAWA_HTML_PATH.exists() else None
+    if store is None or (sourceHash is not None and store.metadata.get("source_hash") != sourceHash):
+        with profiling.span("ottawa parse"):
+            dates, totals = parseOttawaSeries(OTTAWA_HTML_PATH)
+        saveOttawaStore(dates, totals, sourceHash)
+        return ottawaRows(dates, totals)
+    if not store.hasMetric("confirmed_doubling"):
+        return ottawaRows(store.dates, store.series(0, "confirmed"))
+    return ottawaRows(store.dates, store.series(0, "confirmed"), store.series(0, "confirmed_new"),
+                      store.series(0, "confirmed_growth"), store.series(0, "confirmed_doubling"))
+
+
+def parseOttawaData(ottawaPath : Path):
+    return ottawaRows(*parseOttawaSeries(ottawaPath))
+
 
+def ottawaRows(dates: List[str], totals, new=None, growth=None, doubling=None):
+    """
+    Rows of (date, total, new, %growth, days to double). The derived series follow
+    the metrics definitions and are computed unless given.
+    """
+    import numpy as np
+    import metrics
+
+    totals = np.asarray(totals)
+    new = metrics.newCases(totals) if new is None else new
+    growth = metrics.growthSeries(totals) if growth is None else growth
+    doubling = metrics.doublingDays(growth) if doubling is None else doubling
+
+    result = []
+    for d, v, diff, percentage, days in zip(dates, totals.tolist(), np.asarray(new).tolist(),
+                                            np.nan_to_num(growth).tolist(), np.asarray(doubling).tolist()):
+        daysToDouble = 99.9 if math.isnan(days) else round(days)  # use 99.9 for infinite
         result.append((d,v,diff,percentage,daysToDouble))
     return result
 
 
+def smoothRows(data, smooth: Smoothing, window: int = SMOOTH_WINDOW):
+    """
+    The rows with the new cases smoothed and the growth averaged over the window
+    """
+    import numpy as np
+    import metrics
+    import smoothing
+
+    totals = np.array([r[1] for r in data])
+    growth = smoothing.growthRate(totals, window)
+    return ottawaRows([r[0] for r in data], totals, smoothing.smooth(metrics.newCases(totals), smooth, window),
+                      growth, metrics.doublingDays(growth))
+
 
 @app.command(help="Generate table using Ottawa data")
-def table(tableformat: TabulateTableTypes = TabulateTableTypes.simple, file:Path = typer.Argument(None, file_okay=True,resolve_path=True,)):
+def table(tableformat: TabulateTableTypes = TabulateTableTypes.simple, file:Path = typer.Argument(None, file_okay=True,resolve_path=True,),
+          smooth: Smoothing = typer.Option(None, help="Smooth the new cases, the growth becomes the average daily growth over the window"),
+          window: int = typer.Option(SMOOTH_WINDOW, help="Days of the --smooth window")):
 
-    ottawaPath = OTTAWA_HTML_PATH
+    ensureOttawaData()
+    from tabulate import tabulate
 
-    data = parseOttawaData(ottawaPath)
+    data = loadOttawaData()
+    if smooth is not None:
+        data = smoothRows(data, smooth, window)
 
     if file:
         pass
@@ -110,12 +194,9 @@ def table(tableformat: TabulateTableTypes = TabulateTableTypes.simple, file:Path
         print(F"\nData for Ottawa as of {data[-1][0]}\n")
         print(tabulate(data,headers=["num","date","total","new","%growth","days to\ndouble"], showindex=range(1, len(data)+1), floatfmt=".01f", tablefmt=tableformat))
 
-@app.command(help="Generate plots for Ottawa data at the optional path. If a path is not specified the plot is displayed interactively using matplotlib.")
-def plot(movingaverage:int = None, file:Path = typer.Argument(None, file_okay=True,resolve_path=True,)):
-
-    ottawaPath = OTTAWA_HTML_PATH
-
-    data = parseOttawaData(ottawaPath)
+def drawOttawa(fig, data, smooth: Smoothing = None, window: int = SMOOTH_WINDOW):
+    import numpy as np
+    import smoothing
 
     dates = [r[0] for r in data]
     totalCases = [r[1] for r in data]
@@ -126,13 +207,13 @@ def plot(movingaverage:int = None, file:Path = typer.Argument(None, file_okay=Tr
     totalCasesMovingAverage = None
     newCasesMovingAverage = None
 
-    if movingaverage:
-        totalCasesMovingAverage = (pd.Series(totalCases).rolling(window=movingaverage).mean().iloc[:].values).tolist()
-        newCasesMovingAverage = (pd.Series(newCases).rolling(window=movingaverage).mean().iloc[:].values).tolist()
+    if smooth is not None:
+        # both series in one call
+        totalCasesMovingAverage, newCasesMovingAverage = smoothing.smooth(np.array([totalCases, newCases]), smooth, window).tolist()
 
-    fig, axs = plt.subplots(1, 4, figsize=(18, 8))
+    axs = fig.subplots(1, 4)
 
-    plt.suptitle(f'Ottawa {dates[-1]}\n', y=1.05, weight="bold")
+    fig.suptitle(f'Ottawa {dates[-1]}\n', y=1.05, weight="bold")
 
     axs[0].set_title(f"Total cases,\n..., {totalCases[-3]}, {totalCases[-2]}, {totalCases[-1]}")
     axs[0].set_ylabel(f"Infected")
@@ -162,26 +243,67 @@ def plot(movingaverage:int = None, file:Path = typer.Argument(None, file_okay=Tr
     axs[2].grid(True)
     axs[3].grid(True)
 
-    plt.tight_layout()
+    fig.tight_layout()
+
+
+def ottawaPng(data, smooth: Smoothing = None, window: int = SMOOTH_WINDOW) -> bytes:
+    """
+    The ottawa plot as a png, from the plot cache when the same data was plotted before
+    """
+    import numpy as np
+    from plotCache import PlotCache, cacheKey
+
+    values = np.array([r[1:] for r in data], dtype=np.float64)
+    key = cacheKey("ottawa", [values], {"dates": [data[0][0], data[-1][0]],
+                                             "smooth": smooth and Smoothing(smooth).value, "window": window})
+
+    def draw() -> bytes:
+        from io import BytesIO
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(18, 8))
+        FigureCanvasAgg(fig)
+        drawOttawa(fig, data, smooth, window)
+
+        out = BytesIO()
+        fig.savefig(out, format="png", bbox_inches='tight')
+        return out.getvalue()
+
+    return PlotCache().render(key, draw)
+
+
+@app.command(help="Generate plots for Ottawa data at the optional path. If a path is not specified the plot is displayed interactively using matplotlib.")
+def plot(movingaverage:int = typer.Option(None, help="Same as --smooth rolling --window MOVINGAVERAGE"),
+         file:Path = typer.Argument(None, file_okay=True,resolve_path=True,),
+         smooth: Smoothing = typer.Option(None, help="Draw the smoothed total and new cases over the series"),
+         window: int = typer.Option(SMOOTH_WINDOW, help="Days of the --smooth window")):
+    ensureOttawaData()
+    data = loadOttawaData()
+    if movingaverage:
+        smooth, window = smooth or Smoothing.rolling, movingaverage
 
     if file:
         # if the file is a directory then generate a file name
         if file.is_dir():
-            file = file / F"{dates[-1]}-ottawa.png"
+            file = file / F"{data[-1][0]}-ottawa.png"
 
-        plt.tight_layout()
-        plt.savefig(str(file), bbox_inches='tight')
-        plt.close()
+        file.write_bytes(ottawaPng(data, smooth, window))
         typer.echo(F"Saved plot: {file}")
     else:
+        import matplotlib.pyplot as plt
+
+        drawOttawa(plt.figure(figsize=(18, 8)), data, smooth, window)
         plt.show()
 
-# This is the main application: add CLI Parameters for the main CLI Application herSKIP_FETCHING_HTML = False
+# This is the main application: add CLI Parameters for the main CLI Application her
 
 SKIP_FETCHING_HTML = False
+REFRESH = False
 
 @app.callback()
-def main(ctx: typer.Context):
+def main(ctx: typer.Context,
+         refresh: bool = typer.Option(False, help=F"Fetch the page even if the local copy is less than {OTTAWA_TTL}s old")):
     """
         This CLI processes Ottawa data using the Ottawa PHU data:
 
@@ -192,14 +314,9 @@ def main(ctx: typer.Context):
     LOG.debug(F"OTTAWA: command path: {ctx.command_path}")
     LOG.debug(F"OTTAWA: executing sub command: {ctx.invoked_subcommand}")
 
-    # NOTE: this code will get executed even when we do covid ottawa table --help
-    if not SKIP_FETCHING_HTML:
-        typer.echo("Loading data from website...  ",nl=False)
-        with click_spinner.spinner():
-            ottawaPath = getOttawaData(OTTAWA_HTML_PATH)
-        typer.echo("     DONE")
-        if ottawaPath is None:
-            return -1
+    # the page is fetched by the commands themselves (ensureOttawaData) so --help does not hit the network
+    global REFRESH
+    REFRESH = refresh
 
 if __name__ == '__main__':
     logging.basicConfig(
@@ -0,0 +1,94 @@
+"""
+  Size bounded on-disk cache of rendered plots.
+
+  A plot is keyed by a hash of the series it shows plus its parameters, so a
+  repeated request for the same comparison returns the cached png without
+  touching matplotlib. The least recently used pngs are evicted when the cache
+  grows over its size.
+
+    png = PlotCache().render(cacheKey("compare", series, params), lambda: drawPng(...))
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from config import PLOT_CACHE_DIR, PLOT_CACHE_SIZE
+
+LOG = logging.getLogger(__name__)
+
+# bump when the look of the plots changes to invalidate the cache
+VERSION = 1
+
+
+def cacheKey(kind: str, series: Iterable[np.ndarray], params: dict) -> str:
+    h = hashlib.sha256()
+    h.update(F"{kind}:{VERSION}:{json.dumps(params, sort_keys=True, default=str)}".encode())
+    for s in series:
+        s = np.ascontiguousarray(s)
+        h.update(F"{s.dtype.str}{s.shape}".encode())
+        h.update(s.tobytes())
+    return h.hexdigest()
+
+
+class PlotCache:
+
+    def __init__(self, directory: Path = PLOT_CACHE_DIR, maxBytes: int = PLOT_CACHE_SIZE):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / F"{key}.png"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            png = path.read_bytes()
+        except OSError:
+            return None
+        # the modification time is the last use for the LRU eviction
+        os.utime(str(path))
+        LOG.debug(F"Plot cache hit {key}")
+        return png
+
+    def put(self, key: str, png: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(self.directory), suffix=".tmp")
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(png)
+        os.replace(tmp, str(self._path(key)))
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+    def render(self, key: str, draw: Callable[[], bytes]) -> bytes:
+        """
+        Return the cached png of key, drawing and caching it on a miss
+        """
+        png = self.get(key)
+        if png is None:
+            png = draw()
+            self.put(key, png)
+        return png
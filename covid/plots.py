@@ -0,0 +1,191 @@
+"""
+  Plot rendering stage for the processed world data.
+
+  Processing only collects PlotJobs. Rendering happens afterwards, optionally
+  restricted to a selection of regions and fanned out over a process pool.
+  Figures are drawn with the Agg canvas directly so the pyplot backend used by
+  the interactive report commands is left alone. Every process builds its
+  figure once and only updates the lines and titles for each region. Regions
+  can also be drawn as small multiples pages, and low resolution thumbnails
+  written next to the plots.
+"""
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import THUMBNAIL_DIR, THUMBNAIL_DPI
+
+LOG = logging.getLogger(__name__)
+
+
+class PlotJob(NamedTuple):
+    country: str
+    title: str
+    titlePreamble: str
+    data: np.ndarray
+    diff: np.ndarray
+    percent: np.ndarray
+
+
+class RegionFigure:
+    """
+    The figure of a region plot, built once and reused: rendering a job only
+    updates the line data, the limits and the titles before saving.
+    """
+
+    def __init__(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.fig = Figure(figsize=(18, 8))
+        FigureCanvasAgg(self.fig)
+        self.axs = self.fig.subplots(1, 3)
+        self.suptitle = self.fig.suptitle("\n", y=1.05, weight="bold")
+
+        self.lines = []
+        for ax, ylabel, color in zip(self.axs, ("Infected", "Newly Infected", "Percentage growth"), ("black", "red", "green")):
+            ax.set_title(",\n...")
+            ax.set_ylabel(ylabel)
+            self.lines.append(ax.plot([], [], c=color)[0])
+            ax.grid(True)
+        # the layout only depends on the labels, it is computed once
+        self.fig.tight_layout()
+
+    def render(self, plotDir: Path, job: PlotJob, thumbnails: Optional[Path] = None) -> Path:
+        title, data, diff, percent = job.title, job.data, job.diff, job.percent
+
+        self.suptitle.set_text(f'{title}\n')
+        self.axs[0].set_title(f"Total cases,\n..., {data[-3]}, {data[-2]}, {data[-1]}")
+        self.axs[1].set_title(f"New cases,\n..., {diff[-3]}, {diff[-2]}, {diff[-1]}")
+        self.axs[2].set_title(f"Percentage,\n..., {np.round(percent[-3], 1)}, {np.round(percent[-2], )}, {np.round(percent[-1], )}")
+
+        for ax, line, values in zip(self.axs, self.lines, (data, diff, percent)):
+            line.set_data(np.arange(len(values)), values)
+            ax.relim()
+            ax.autoscale_view()
+
+        plotfilepath = plotDir / F"{job.titlePreamble}-{title}.png"
+        self.fig.savefig(str(plotfilepath), bbox_inches='tight')
+        if thumbnails is not None:
+            self.fig.savefig(str(thumbnails / plotfilepath.name), bbox_inches='tight', dpi=THUMBNAIL_DPI)
+        return plotfilepath
+
+
+def doPlot(plotDir: Path, job: PlotJob) -> Path:
+    return RegionFigure().render(plotDir, job)
+
+
+class PageFigure:
+    """
+    Small multiples: the total cases of up to size regions per image, the grid of axes is reused for every page
+    """
+
+    def __init__(self, size: int):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        columns = math.ceil(math.sqrt(size))
+        rows = math.ceil(size / columns)
+        self.fig = Figure(figsize=(3 * columns, 2.5 * rows))
+        FigureCanvasAgg(self.fig)
+        self.axs = self.fig.subplots(rows, columns, squeeze=False).ravel()[:size]
+        for ax in self.fig.axes[size:]:
+            ax.set_visible(False)
+
+        self.lines = []
+        for ax in self.axs:
+            ax.set_title(" ", fontsize="small")
+            ax.tick_params(labelsize="x-small")
+            ax.grid(True)
+            self.lines.append(ax.plot([], [], c="black")[0])
+        self.fig.tight_layout()
+
+    def render(self, path: Path, jobs: List[PlotJob], dpi: Optional[float] = None) -> Path:
+        for i, (ax, line) in enumerate(zip(self.axs, self.lines)):
+            ax.set_visible(i < len(jobs))
+            if i >= len(jobs):
+                continue
+            data = jobs[i].data
+            ax.set_title(F"{jobs[i].title} {data[-1]}", fontsize="small")
+            line.set_data(np.arange(len(data)), data)
+            ax.relim()
+            ax.autoscale_view()
+
+        self.fig.savefig(str(path), bbox_inches='tight', **({"dpi": dpi} if dpi else {}))
+        return path
+
+
+def selectJobs(jobs: Iterable[PlotJob], regions: Optional[List[str]]) -> List[PlotJob]:
+    """
+    Keep the jobs matching one of the regions. A region matches either a country
+    (all of its provinces and cities) or a single plot title, e.g. Canada_Ontario.
+    """
+    jobs = list(jobs)
+    if not regions:
+        return jobs
+    wanted = {r.strip().lower() for r in regions}
+    return [job for job in jobs if job.country.lower() in wanted or job.title.lower() in wanted]
+
+
+def _renderChunk(plotDir: Path, jobs: List[PlotJob], thumbnails: Optional[Path] = None) -> int:
+    figure = RegionFigure()
+    rendered = 0
+    for job in jobs:
+        try:
+            figure.render(plotDir, job, thumbnails)
+            rendered += 1
+        except Exception as x:
+            LOG.warning(F"Failed to plot {job.title}: {x}")
+    return rendered
+
+
+def _renderPages(plotDir: Path, pages: List[Tuple[int, List[PlotJob]]], size: int, thumbnails: Optional[Path] = None) -> int:
+    figure = PageFigure(size)
+    rendered = 0
+    for number, jobs in pages:
+        name = F"{jobs[0].titlePreamble}-page{number:03}.png"
+        try:
+            figure.render(plotDir / name, jobs)
+            if thumbnails is not None:
+                figure.render(thumbnails / name, jobs, THUMBNAIL_DPI)
+            rendered += 1
+        except Exception as x:
+            LOG.warning(F"Failed to plot page {number}: {x}")
+    return rendered
+
+
+def _fanOut(render, plotDir: Path, items: list, workers: int, *args) -> int:
+    """
+    Render the items in one process or split them over workers, each reusing its figure
+    """
+    if workers <= 1 or len(items) == 1:
+        return render(plotDir, items, *args)
+
+    workers = min(workers, len(items))
+    chunks = [items[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(render, [plotDir] * len(chunks), chunks, *[[a] * len(chunks) for a in args]))
+
+
+def renderPlots(plotDir: Path, jobs: List[PlotJob], workers: int = 1, thumbnails: bool = False, pageSize: int = 0) -> int:
+    """
+    Render the jobs into plotDir and return the number of images written. With
+    thumbnails a low resolution copy of every image is written to plotDir/thumbnails.
+    With a pageSize the regions are drawn as small multiples, pageSize per image.
+    """
+    if not jobs:
+        return 0
+
+    plotDir.mkdir(parents=True, exist_ok=True)
+    thumbnailDir = plotDir / THUMBNAIL_DIR if thumbnails else None
+    if thumbnailDir is not None:
+        thumbnailDir.mkdir(exist_ok=True)
+
+    if pageSize > 0:
+        pages = [(number, jobs[i:i + pageSize]) for number, i in enumerate(range(0, len(jobs), pageSize), 1)]
+        return _fanOut(_renderPages, plotDir, pages, workers, min(pageSize, len(jobs)), thumbnailDir)
+    return _fanOut(_renderChunk, plotDir, jobs, workers, thumbnailDir)
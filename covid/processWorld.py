@@ -1,22 +1,34 @@
 import datetime
 import logging
-from pathlib import Path
-import pandas as pd
-from pandas import DataFrame, Series
+import math
+from typing import List, Optional
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 
-import json
-from us_state_abbreviation import us_state_abbrev
+import engine
+from engine import Region
+import ingest
+from ingest import TimeSeries
+import incremental
+import profiling
+import sources
+import storage
+from plots import PlotJob, renderPlots, selectJobs
+from registry import Registry
+from rollup import rollup
 
-from config import ROOT, INDATADIR, LOCAL_CONFIRMED, LOCAL_DEATHS, LOCAL_RECOVERED, PLOT_DIR, DB_DIR
+from config import PLOT_DIR, THUMBNAIL_DIR, DB_DIR, DB_FORMAT, DbFormat, ROLLING_WINDOWS, SOURCES, SourceName
 LOG = logging.getLogger(__name__)
 
-DB = {}
+REGISTRY: Optional[Registry] = None
+PLOTS = []
+TRACKER: Optional[incremental.Tracker] = None
+# the plot outputs of this run, see world process --thumbnails and --page-size
+THUMBNAILS = False
+PAGE_SIZE = 0
 
-def store(*, country:str ,province:str = None, city: str = None, confirmed:list = None,  death:list = None ):
+def store(*, country:str ,province:str = None, city: str = None, confirmed:np.ndarray = None,  death:np.ndarray = None ):
 
     if country is None:
         LOG.warning(F"store requires country to be specified. Country was NONE")
@@ -30,203 +42,150 @@ def store(*, country:str ,province:str = None, city: str = None, confirmed:list
         LOG.warning(F"store requires death data to be specified. death data was NONE or EMPTY")
         return
 
-    country = country.strip()
-    country_record = DB.setdefault(country,{ "name" : country, "confirmed" : confirmed, "death": death, "provinces": { } } )
-    if province is None:
-
-        country_record["confirmed"] = confirmed
-        country_record["death"] = death
-        return
-
-    province_name = province.strip()
-    province = province_name
-    if country == 'US':
-        province = us_state_abbrev.get(province.lower(), province_name)
-
-    province_record = country_record["provinces"].setdefault(province, {"name": province_name, "confirmed":confirmed, "death": death, "cities" : {}})
-    if city is None:
-        province_record["confirmed"] = confirmed
-        province_record["death"] = death
+    # the series are copied into the rows of the registry matrices, the names normalized once per region
+    REGISTRY.set(REGISTRY.intern(country, province, city), confirmed=confirmed, death=death)
+
+def needsUpdate(title: str, titlePreamble: str, confirmed: np.ndarray, death: np.ndarray) -> bool:
+    """
+    True when the series of the region changed since the previous run or one of its
+    plots is missing. A page holds several regions: with pages every region is plotted
+    """
+    # an appended date changes the plot as much as a revision: both are replotted
+    changed = TRACKER is None or TRACKER.update(title, confirmed, death)
+    if changed or PAGE_SIZE > 0:
+        return True
+    name = F"{titlePreamble}-{title}.png"
+    return not (PLOT_DIR / name).exists() or (THUMBNAILS and not (PLOT_DIR / THUMBNAIL_DIR / name).exists())
+
+def getTitlePreamble(ts: TimeSeries) -> str:
+    # get the date of the last column - we will use that as the timestamp
+    dt = datetime.datetime.strptime(ts.columns[-1], ingest.DATE_FORMAT)
+    return F"{dt.year}{dt.month:02}{dt.day:02}"
+
+def addPlots(regions: List[Region], counts: np.ndarray, changed: List[int], titlePreamble: str):
+    if not changed:
         return
 
-    city = city.strip()
-    city_record = province_record["cities"].setdefault(city, {"name": city, "confirmed":confirmed, "death": death })
-    city_record["confirmed"] = confirmed
-    city_record["death"] = death
-
-def doPlot(title, titlePreamble, data, diff, percent):
-
-    fig, axs = plt.subplots(1, 3, figsize=(18, 8))
-
-    plt.suptitle(f'{title}\n', y=1.05, weight="bold")
-
-    axs[0].set_title(f"Total cases,\n..., {data[-3]}, {data[-2]}, {data[-1]}")
-    axs[0].set_ylabel(f"Infected")
-    axs[0].plot(data, c="black")
-
-    axs[1].set_title(f"New cases,\n..., {diff[-3]}, {diff[-2]}, {diff[-1]}")
-    axs[1].set_ylabel(f"Newly Infected")
-    axs[1].plot(diff, c="red")
-
-    axs[2].set_title(f"Percentage,\n..., {np.round(percent[-3], 1)}, {np.round(percent[-2], )}, {np.round(percent[-1], )}")
-    axs[2].set_ylabel(f"Percentage growth")
-    axs[2].plot(percent, c="green")
-
-    axs[0].grid(True)
-    axs[1].grid(True)
-    axs[2].grid(True)
-
-    # plt.show()
-    plotfilepath = PLOT_DIR / F"{titlePreamble}-{title}.png"
-    plt.tight_layout()
-    plt.savefig(str(plotfilepath), bbox_inches='tight')
-    plt.close()
-
+    # only the regions that changed are recomputed and plotted
+    data, diff, percent = engine.computeMatrix(counts[changed])
+    for i, index in enumerate(changed):
+        country, title = regions[index].country, regions[index].title
+        PLOTS.append(PlotJob(country, title, titlePreamble, data[i], diff[i], percent[i]))
 
-def computeFromRow(row:Series):
+def doRows(confirmed: TimeSeries, death: TimeSeries):
 
-    data = row[4:].to_numpy()
-    diff = np.diff(data, 1)
-    percent = 100 * np.divide(diff, data[1:], out=np.zeros_like(diff), where=data[1:] != 0)
+    titlePreamble = getTitlePreamble(confirmed)
 
-    return data, diff, percent
+    regions = engine.regionKeys(confirmed)
+    deathIndex = engine.alignRows(confirmed, death)
 
-def doRows(confirmed: pd.DataFrame, death: pd.DataFrame):
+    c_all = confirmed.counts
+    d_all = death.counts
 
-    for index, row in  confirmed.iterrows():
+    changed = []
+    for index, (country, province, city, title) in enumerate(regions):
         try:
-            #print(F"index: {index} row: {row}")
-
-            # get the date of the last column - we will use that as the timestamp
-            colName = row.index[-1]
-            dt = datetime.datetime.strptime(colName, '%m/%d/%y')
-
-            titlePreamble = F"{dt.year}{dt.month:02}{dt.day:02}"
-            # we want to skip over cities
-            province = row[0]
-            country  = row[1]
-
-            # get the rows from the other data frame
-
-            death_row = death[death['Country/Region'] == country]
-            if isinstance(province, str):
-                death_row = death_row[death_row['Province/State'] == province]
-
-            isProvince = False
-            isCountryOnly = False
-            if isinstance(province, str):
-                isProvince = province.find(",") == -1
-            else:
-                isCountryOnly = True
-
-            if isCountryOnly:
-                title = country
-                province, city = None, None
-            elif isProvince:
-                title = F"{country}_{province}"
-                city = None
-            else:
-                city, province = province.split(",",1)
-                title = F"{country}_{province}_{city}"
-
             LOG.info(F"{country} {province} {city}")
 
-            lat, lon = row[2:4]
-            # get the data as a numpy array
-
-            confirmed_data, confirmed_diff, confirmed_percent = computeFromRow(row)
-
-            x = death_row.iloc[0]
-            death_data, death_diff, death_percent = computeFromRow(x)
-
-            doPlot(title, titlePreamble, confirmed_data, confirmed_diff, confirmed_percent)
+            if deathIndex[index] < 0:
+                raise IndexError(F"no death data for {title}")
 
-            c = confirmed_data.astype(np.int32)
-            d = death_data.astype(np.int32)
+            c = c_all[index]
+            d = d_all[deathIndex[index]]
 
+            if needsUpdate(title, titlePreamble, c, d):
+                changed.append(index)
 
-            if isCountryOnly:
-                store(country=country,province = None, city = None, confirmed = c.tolist(),  death=d.tolist())
-            else:
-                store(country = country, province=province, city=city, confirmed=c.tolist(), death=d.tolist() )
+            store(country = country, province=province, city=city, confirmed=c, death=d)
+            profiling.count("rows_processed")
         except Exception as x:
+            profiling.count("rows_failed")
             LOG.warning(F"While processing country: {country} province: {province} got exception: {x}")
 
+    addPlots(regions, c_all, changed, titlePreamble)
 
-def compute(data):
-
-    if data is not None:
-        data = np.sum(data[:, 4:], axis=0)
-        data = data[np.newaxis, :]
-        diff = np.diff(data[0, 4:], 1)
-        percent = 100 * np.divide(diff, data[0, 5:], out=np.zeros_like(diff), where=data[0, 5:] != 0)
-
-        return data, diff, percent
-    return None, None, None
-
-def extract(country, df):
+def doRollups(confirmed: TimeSeries, death: TimeSeries):
+    """
+    Store the countries and provinces that are only reported through their subregions
+    """
+    titlePreamble = getTitlePreamble(confirmed)
 
-    if df is None:
-        raise Exception("Dataframe is none")
+    regions = engine.regionKeys(confirmed)
+    deathIndex = engine.alignRows(confirmed, death)
+    rows = np.flatnonzero(deathIndex >= 0)
 
-    if country == "US": # us is special because it reports cities
-        df = df[df['Province/State'].str.contains(",") == False]
+    result = rollup([regions[i] for i in rows], confirmed.counts[rows], death.counts[deathIndex[rows]])
 
-    province = None
-    city     = None
-    LOG.info(F"{country} {province} {city}")
+    changed = []
+    for index, (country, province, city, title) in enumerate(result.regions):
+        LOG.info(F"{country} {province} {city}")
+        c = result.confirmed[index]
+        d = result.death[index]
 
+        if needsUpdate(title, titlePreamble, c, d):
+            changed.append(index)
 
-    # get the last column name of the dataframe so we can create the timestamp for the filename
-    colName = list(df.columns)[-1]
-    dt = datetime.datetime.strptime(colName, '%m/%d/%y')
+        store(country=country, province=province, city=None, confirmed=c, death=d)
 
-    titlePreamble = F"{dt.year}{dt.month:02}{dt.day:02}"
+    profiling.count("regions_rolled_up", len(result.regions))
+    addPlots(result.regions, result.confirmed, changed, titlePreamble)
 
-    data = df.to_numpy()
 
-    return country, province, city, titlePreamble, data
+def process(plots: bool = True, regions: List[str] = None, workers: int = 1, full: bool = False, dbFormat: DbFormat = DB_FORMAT,
+            windows: List[int] = ROLLING_WINDOWS, sourceNames: List[SourceName] = SOURCES, thumbnails: bool = False, pageSize: int = 0,
+            history: bool = False):
+    global REGISTRY, PLOTS, TRACKER, THUMBNAILS, PAGE_SIZE
 
-def doCountry(country: str, df_confirmed : DataFrame, df_death : DataFrame):
+    with profiling.span("ingest"):
+        ts_confirmed, ts_death, sourceMetadata = sources.load(sources.getSources(sourceNames))
 
-    LOG.info(F"Processing country: {country}")
+    # the dates in the data as YYYY-MM-DD
+    dts = ts_confirmed.dates
 
-    df_confirmed_country = df_confirmed[df_confirmed['Country/Region'] == country]
-    df_death_country = df_death[df_death['Country/Region'] == country]
+    metadata = { 'start' : dts[0], "end": dts[-1], "dates" : dts, "sources": sourceMetadata}
+    # a second run in the same interpreter starts from an empty registry and no plot jobs
+    REGISTRY = Registry(len(dts), capacity=len(ts_confirmed))
+    PLOTS = []
+    THUMBNAILS, PAGE_SIZE = plots and thumbnails, pageSize if plots else 0
 
-    country, province, city, titlePreamble, confirmed = extract(country, df_confirmed_country)
-    countryD, provinceD, cityD, titlePreambleD, death = extract(country,  df_death_country)
+    backend = storage.getBackend(dbFormat, DB_DIR, **({"windows": windows} if dbFormat == DbFormat.npy else {}))
+    TRACKER = incremental.Tracker(DB_DIR / "fingerprints.json", dts, full=full or not backend.exists())
 
-    confirmed, confirmed_diff, confirmed_percent = compute(confirmed)
-    death, death_diff, death_percent = compute(death)
+    with profiling.span("rows"):
+        doRows(ts_confirmed, ts_death)
+    with profiling.span("rollup"):
+        doRollups(ts_confirmed, ts_death)
 
-    doPlot(country, titlePreamble, confirmed[0,:], confirmed_diff, confirmed_percent)
-    store(country=country,province=province,city=city,confirmed=list(confirmed[0,:]),death=list(death[0,:]))
-
-
-def process():
-    df_confirmed = pd.read_csv(LOCAL_CONFIRMED)
-    df_death     = pd.read_csv(LOCAL_DEATHS)
-
-    # create an array of the dates in the data.  column 4 is the start of the data
-    dts = [datetime.datetime.strptime(cn, '%m/%d/%y') for cn in list(df_confirmed.columns.values)[4:]]
-    dts = [F"{d.year}-{d.month:02}-{d.day:02}" for d in dts]
-
-    DB['metadata'] = { 'start' : dts[0], "end": dts[-1], "dates" : dts}
-
-    doCountry("Canada", df_confirmed, df_death)
-    # no longer needed doCountry("US", df_confirmed, df_recovered, df_death)
-    doCountry("China", df_confirmed, df_death)
-    doCountry("Australia", df_confirmed, df_death)
-    doRows(df_confirmed, df_death)
+    LOG.info(F"Regions {TRACKER.summary()}")
+    if profiling.COUNTERS["rows_failed"]:
+        LOG.warning(F"{profiling.COUNTERS['rows_failed']} rows failed, see the warnings above")
 
     if not DB_DIR.exists():
         DB_DIR.mkdir(parents=True, exist_ok=True)
 
-    DB_PATH = DB_DIR / "db.json"
-
-    with open(DB_PATH, "w") as dbfile:
-        json.dump(DB, dbfile, indent=2)
+    # the history keeps its own snapshots when it is the database written
+    historyBackend = storage.SqliteBackend(DB_DIR) if history and backend.name != DbFormat.sqlite else None
+
+    if TRACKER.changed or not backend.exists() or (historyBackend is not None and not historyBackend.exists()):
+        with profiling.span("write"):
+            # the registry matrices are written as they are, without a nested db in between
+            records, series = REGISTRY.flat()
+            written = backend.writeFlat(metadata, records, series)
+            if historyBackend is not None:
+                profiling.count("bytes_written", historyBackend.writeFlat(metadata, records, series))
+            TRACKER.save()
+        profiling.count("bytes_written", written)
+        LOG.info(F"Wrote {written} bytes to {backend.path}")
+
+    # plots are a separate stage so the database is written even when they are skipped
+    if plots:
+        jobs = selectJobs(PLOTS, regions)
+        if PAGE_SIZE > 0:
+            LOG.info(F"Rendering {len(jobs)} regions on {math.ceil(len(jobs) / PAGE_SIZE)} pages using {workers} workers")
+        else:
+            LOG.info(F"Rendering {len(jobs)} plots using {workers} workers")
+        with profiling.span("plots"):
+            profiling.count("plots_written", renderPlots(PLOT_DIR, jobs, workers, thumbnails, pageSize))
 
     LOG.info("DONE")
 
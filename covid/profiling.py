@@ -0,0 +1,84 @@
+"""
+  Timing spans and counters for the processing pipeline.
+
+  The stages wrap their work in a span and count what they processed:
+
+    with profiling.span("ingest"):
+        ...
+    profiling.count("rows_failed")
+
+  Spans cost a perf_counter call each and are always recorded. The covid
+  --profile option prints the stage breakdown when the command ends, and
+  --profile-out writes either a cProfile file (.prof) or a json trace that
+  chrome://tracing and https://ui.perfetto.dev can load.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple
+
+LOG = logging.getLogger(__name__)
+
+
+class Span(NamedTuple):
+    name: str
+    depth: int
+    start: float
+    seconds: float
+    thread: int
+
+
+SPANS: List[Span] = []
+COUNTERS = Counter()
+
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+@contextmanager
+def span(name: str):
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPANS.append(Span(name, depth, start - _origin, time.perf_counter() - start, threading.get_ident()))
+        _local.depth = depth
+
+
+def count(name: str, n: int = 1) -> None:
+    COUNTERS[name] += n
+
+
+def reset() -> None:
+    SPANS.clear()
+    COUNTERS.clear()
+
+
+def breakdown() -> str:
+    """
+    The spans in start order, indented by nesting, followed by the counters
+    """
+    lines = ["Stage                                     Seconds"]
+    for s in sorted(SPANS, key=lambda s: s.start):
+        lines.append(F"{'  ' * s.depth + s.name:<40} {s.seconds:8.3f}")
+    for name, value in sorted(COUNTERS.items()):
+        lines.append(F"{name:<40} {value:8}")
+    return "\n".join(lines)
+
+
+def writeTrace(path: Path) -> None:
+    """
+    Write the spans as trace events and the counters as metadata (chrome trace format)
+    """
+    pid = os.getpid()
+    events = [{"name": s.name, "ph": "X", "ts": s.start * 1e6, "dur": s.seconds * 1e6, "pid": pid, "tid": s.thread}
+              for s in SPANS]
+    with open(path, "w") as outfile:
+        json.dump({"traceEvents": events, "otherData": dict(COUNTERS)}, outfile, indent=1)
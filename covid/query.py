@@ -0,0 +1,211 @@
+"""
+  Read-only query API over the processed data.
+
+  A Store is opened once. Regions are looked up by name through the sorted key
+  index and series are returned as numpy views of the memory-mapped metric
+  matrices, so only the regions actually touched are paged in.
+
+    store = Store.open()
+    row = store.find("Canada", "Ontario")
+    confirmed = store.series(row, "confirmed")
+
+  Names as users type them ("usa", "Korea", "US/WA") are looked up in a batch
+  through the name index written with the store:
+
+    rows = store.lookup(["usa", "Korea"])
+
+  Dates are ISO strings (YYYY-MM-DD). A date range maps to a column slice:
+
+    columns = store.dateSlice("2020-03-01", "2020-03-31")
+    march = store.series(row, "confirmed")[columns]
+"""
+import bisect
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import metrics as derivedMetrics
+import storage
+from regionIndex import NAMES_FILE, RegionIndex
+from config import DB_DIR
+
+LOG = logging.getLogger(__name__)
+
+
+class Store:
+
+    def __init__(self, metadata: dict, metrics: Dict[str, np.ndarray], keys: np.ndarray, order: np.ndarray,
+                 levels: np.ndarray, regions: Optional[List[dict]] = None, path: Optional[Path] = None):
+        self.metadata = metadata
+        self.metrics = metrics
+        self.keys = keys
+        self.order = order
+        self.levels = levels
+        self.path = path
+        self._regions = regions
+        self._dateIndex = None
+        self._nameIndex = None
+
+    @classmethod
+    def open(cls, dbDir: Path = DB_DIR, name: str = "world") -> Optional["Store"]:
+        """
+        Open the columnar store dbDir/name. For the world data fall back to db.json,
+        then to the latest sqlite snapshot. Returns None when there is no data.
+        """
+        path = dbDir / name
+        if (path / storage.INDEX_FILE).exists():
+            return cls.fromColumnar(path)
+
+        for backend in (storage.JsonBackend(dbDir), storage.SqliteBackend(dbDir)):
+            if name == "world" and backend.exists():
+                LOG.debug(F"No columnar store at {path}, loading {backend.path}")
+                return cls.fromDict(backend.read())
+
+        LOG.debug(F"No {name} data in {dbDir}")
+        return None
+
+    @classmethod
+    def openSnapshot(cls, snapshot: int, dbDir: Path = DB_DIR) -> Optional["Store"]:
+        """
+        The world data as of a snapshot of the sqlite history. None when there is no such snapshot
+        """
+        backend = storage.SqliteBackend(dbDir)
+        db = backend.read(snapshot) if backend.exists() else None
+        return None if db is None else cls.fromDict(db)
+
+    @classmethod
+    def fromColumnar(cls, path: Path) -> "Store":
+        with open(path / storage.INDEX_FILE, "r") as indexfile:
+            index = json.load(indexfile)
+
+        def load(name):
+            return np.load(str(path / F"{name}.npy"), mmap_mode='r')
+
+        metrics = {metric: load(metric) for metric in index["metrics"]}
+        return cls(index["metadata"], metrics, load("keys"), load("order"), load("level"), path=path)
+
+    @classmethod
+    def fromDict(cls, db: dict) -> "Store":
+        metadata, regions, metrics = storage.flatten(db)
+        keys, order, levels = storage.keyIndex(regions)
+        return cls(metadata, metrics, keys, order, levels, regions=regions)
+
+    @property
+    def dates(self) -> List[str]:
+        return self.metadata.get("dates", [])
+
+    @property
+    def start(self) -> str:
+        return self.metadata.get("start")
+
+    @property
+    def end(self) -> str:
+        return self.metadata.get("end")
+
+    @property
+    def regions(self) -> List[dict]:
+        """
+        The region records. Parsed on first use only
+        """
+        if self._regions is None:
+            with open(self.path / storage.REGIONS_FILE, "r") as regionsfile:
+                self._regions = json.load(regionsfile)
+        return self._regions
+
+    @property
+    def dateIndex(self) -> Dict[str, int]:
+        """
+        The column offset of every date
+        """
+        if self._dateIndex is None:
+            self._dateIndex = {date: offset for offset, date in enumerate(self.dates)}
+        return self._dateIndex
+
+    @property
+    def nameIndex(self) -> RegionIndex:
+        """
+        The name index written by world process, built from the regions for older stores
+        """
+        if self._nameIndex is None:
+            path = None if self.path is None else self.path / NAMES_FILE
+            if path is not None and path.exists():
+                self._nameIndex = RegionIndex.load(path)
+            else:
+                self._nameIndex = RegionIndex.build(self.regions)
+        return self._nameIndex
+
+    def lookup(self, names: List[str]) -> List[Optional[int]]:
+        """
+        The row of every name (alias, ISO code, US state, any case), None when it is not found
+        """
+        return self.nameIndex.lookup(names)
+
+    def suggest(self, name: str) -> List[str]:
+        """
+        Region names close to a name that was not found
+        """
+        return self.nameIndex.suggest(name)
+
+    def offset(self, date: str) -> Optional[int]:
+        return self.dateIndex.get(date)
+
+    def dateSlice(self, start: Optional[str] = None, end: Optional[str] = None) -> slice:
+        """
+        The columns from start to end, both included. A date outside of the data
+        is clamped to the first or last date.
+        """
+        first = 0 if start is None else self.offset(start)
+        if first is None:
+            first = bisect.bisect_left(self.dates, start)
+        last = len(self.dates) - 1 if end is None else self.offset(end)
+        if last is None:
+            last = bisect.bisect_right(self.dates, end) - 1
+        return slice(first, max(first, last + 1))
+
+    def first(self, metric: str = "confirmed", rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Offset of the first non zero day of the rows, -1 when there is none.
+        Precomputed by world process, computed for older stores.
+        """
+        if self.hasMetric(F"{metric}_first"):
+            return self.matrix(F"{metric}_first", rows)
+        return derivedMetrics.firstNonZero(self.matrix(metric, rows))
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def find(self, country: str, province: Optional[str] = None, city: Optional[str] = None) -> Optional[int]:
+        """
+        Return the row of the region or None
+        """
+        key = storage.regionKey(country, province, city)
+        position = int(np.searchsorted(self.keys, key))
+        if position < len(self.keys) and self.keys[position] == key:
+            return int(self.order[position])
+        return None
+
+    def series(self, row: int, metric: str = "confirmed") -> np.ndarray:
+        return self.metrics[metric][row]
+
+    def matrix(self, metric: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        matrix = self.metrics[metric]
+        return matrix if rows is None else matrix[rows]
+
+    def hasMetric(self, metric: str) -> bool:
+        return metric in self.metrics
+
+    def level(self, level: int) -> np.ndarray:
+        """
+        Rows of all regions at a level of the hierarchy, e.g. storage.LEVEL_COUNTRY
+        """
+        return np.flatnonzero(np.asarray(self.levels) == level)
+
+    def countries(self) -> np.ndarray:
+        return self.level(storage.LEVEL_COUNTRY)
+
+    def names(self, rows) -> List[str]:
+        regions = self.regions
+        return [regions[row]["name"] for row in rows]
@@ -0,0 +1,184 @@
+"""
+  Name index of the regions for the report lookups.
+
+  Maps every name a region is likely to be typed as to its row:
+
+    - the region names, case folded, without accents and punctuation
+    - the country aliases and ISO codes (see country_codes.py)
+    - the US states by name and abbreviation (see us_state_abbreviation.py)
+    - provinces and cities qualified by their parents: "US/WA", "WA, US", "King, WA"
+
+  A name shared by regions of different levels goes to the country, then the
+  province: CA is Canada and US/CA is California.
+
+  world process writes the index next to the columnar store, so report loads a
+  ready dict. A name that is not found gets suggestions from a trigram index of
+  the names, written separately and loaded only on a miss.
+
+    index = RegionIndex.build(regions)
+    rows = index.lookup(["usa", "Korea", "US/WA"])
+    index.suggest("Kanada")
+"""
+import json
+import logging
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from country_codes import country_aliases, country_codes
+from us_state_abbreviation import us_state_abbrev
+
+LOG = logging.getLogger(__name__)
+
+NAMES_FILE = "names.json"
+TRIGRAMS_FILE = "trigrams.json"
+
+SUGGESTIONS = 3
+
+# abbreviation -> state name
+STATE_NAMES = {abbreviation: state for state, abbreviation in us_state_abbrev.items()}
+
+ALIASES: Dict[str, List[str]] = {}
+for _alias, _country in country_aliases.items():
+    ALIASES.setdefault(_country, []).append(_alias)
+
+
+def normalize(name: Optional[str]) -> str:
+    """
+    Case folded, accents removed, every run of punctuation and spaces turned into one space
+    """
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(re.split(r"[\W_]+", name.casefold())).strip()
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = F"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def label(region: dict) -> str:
+    """
+    The name a region is suggested as, which the lookup finds back
+    """
+    return "/".join(part for part in (region["country"], region["province"], region["city"]) if part)
+
+
+def _level(region: dict) -> int:
+    return 0 if region["province"] is None else 1 if region["city"] is None else 2
+
+
+def _countryNames(country: str) -> Set[str]:
+    return {normalize(name) for name in (country, *country_codes.get(country, ()), *ALIASES.get(country, ()))}
+
+
+def _provinceNames(region: dict) -> Set[str]:
+    names = {normalize(region["province"]), normalize(region["name"] if region["city"] is None else None)}
+    if region["country"] == "US":
+        names.add(normalize(STATE_NAMES.get(region["province"])))
+    names.discard("")
+    return names
+
+
+def regionNames(region: dict) -> Set[str]:
+    """
+    The keys of a region in the index
+    """
+    countries = _countryNames(region["country"])
+    if region["province"] is None:
+        return countries
+
+    provinces = _provinceNames(region)
+    if region["city"] is None:
+        return provinces | {F"{c} {p}" for c in countries for p in provinces} | {F"{p} {c}" for c in countries for p in provinces}
+
+    city = normalize(region["city"])
+    return ({city} | {F"{city} {p}" for p in provinces} | {F"{c} {p} {city}" for c in countries for p in provinces}
+            | {F"{city} {p} {c}" for c in countries for p in provinces})
+
+
+class RegionIndex:
+
+    def __init__(self, names: Dict[str, int], labels: List[str], path: Optional[Path] = None):
+        self.names = names
+        self.labels = labels
+        self.path = path
+        self._trigrams: Optional[Dict[str, List[int]]] = None
+        self._keys: Optional[List[str]] = None
+
+    @classmethod
+    def build(cls, regions: List[dict]) -> "RegionIndex":
+        names = {}
+        # countries first, then provinces, then cities: the upper level keeps a shared name
+        for row in sorted(range(len(regions)), key=lambda row: _level(regions[row])):
+            for name in regionNames(regions[row]):
+                names.setdefault(name, row)
+        return cls(names, [label(region) for region in regions])
+
+    @classmethod
+    def load(cls, namesPath: Path) -> "RegionIndex":
+        with open(namesPath, "r") as namesfile:
+            index = json.load(namesfile)
+        return cls(index["names"], index["labels"], namesPath)
+
+    def write(self, namesPath: Path, trigramsPath: Path) -> None:
+        with open(namesPath, "w") as namesfile:
+            json.dump({"names": self.names, "labels": self.labels}, namesfile)
+        with open(trigramsPath, "w") as trigramsfile:
+            json.dump(self.trigrams, trigramsfile)
+
+    @property
+    def keys(self) -> List[str]:
+        if self._keys is None:
+            self._keys = list(self.names)
+        return self._keys
+
+    @property
+    def trigrams(self) -> Dict[str, List[int]]:
+        """
+        trigram -> the keys (positions in keys) holding it. Read from the trigrams
+        file next to the names when there is one
+        """
+        if self._trigrams is None:
+            path = None if self.path is None else self.path.with_name(TRIGRAMS_FILE)
+            if path is not None and path.exists():
+                with open(path, "r") as trigramsfile:
+                    self._trigrams = json.load(trigramsfile)
+            else:
+                postings = {}
+                for position, key in enumerate(self.keys):
+                    for trigram in trigrams(key):
+                        postings.setdefault(trigram, []).append(position)
+                self._trigrams = postings
+        return self._trigrams
+
+    def find(self, name: str) -> Optional[int]:
+        return self.names.get(normalize(name))
+
+    def lookup(self, names: List[str]) -> List[Optional[int]]:
+        """
+        The row of every name, None for a name that is not found
+        """
+        return [self.names.get(normalize(name)) for name in names]
+
+    def suggest(self, name: str, limit: int = SUGGESTIONS) -> List[str]:
+        """
+        The labels of the regions whose names share the most trigrams with name (Jaccard)
+        """
+        query = trigrams(normalize(name))
+        postings = self.trigrams
+        shared = Counter(position for trigram in query for position in postings.get(trigram, ()))
+
+        keys = self.keys
+        scores = {}
+        for position, count in shared.items():
+            score = count / (len(query) + len(trigrams(keys[position])) - count)
+            row = self.names[keys[position]]
+            scores[row] = max(score, scores.get(row, 0))
+        best = sorted(scores, key=lambda row: (-scores[row], row))[:limit]
+        return [self.labels[row] for row in best]
+
@@ -0,0 +1,135 @@
+"""
+  In memory registry of the regions built by world process.
+
+  Every region is interned once: it gets an integer id, a pointer to its parent
+  (country > province > city) and a row in one shared matrix per metric, so a
+  region's series is a slice of that matrix rather than a list of python ints.
+
+    registry = Registry(len(dates), capacity=len(confirmed))
+    region = registry.intern("US", "Washington", "King")
+    registry.set(region, confirmed=counts, death=deaths)
+    backend.writeFlat(metadata, *registry.flat())
+
+  Names are normalized once when a region is interned: stripped, and US states
+  stored under their abbreviation (see rollup.provinceKey). The report lookups
+  by name are served by the index written with the store, see regionIndex.py.
+
+  flat() returns the regions and matrices the storage backends write, in the
+  order the regions were first seen, depth first.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import storage
+from rollup import provinceKey
+
+LOG = logging.getLogger(__name__)
+
+NO_PARENT = -1
+
+
+class RegionRecord:
+    __slots__ = ("id", "country", "province", "city", "name", "parent", "level", "children")
+
+    def __init__(self, id: int, country: str, province: Optional[str], city: Optional[str], name: str, parent: int):
+        self.id = id
+        self.country = country
+        self.province = province       # US states by their abbreviation
+        self.city = city
+        self.name = name
+        self.parent = parent
+        self.level = storage.LEVEL_COUNTRY if province is None else storage.LEVEL_PROVINCE if city is None else storage.LEVEL_CITY
+        self.children: List[int] = []
+
+    def asDict(self) -> dict:
+        return {"country": self.country, "province": self.province, "city": self.city, "name": self.name}
+
+
+class Registry:
+
+    def __init__(self, dates: int, capacity: int = 0, metrics=storage.METRICS):
+        self.dates = dates
+        self.records: List[RegionRecord] = []
+        self.roots: List[int] = []
+        self.series = {metric: np.zeros((capacity, dates), dtype=np.int32) for metric in metrics}
+        # (country, province, city) as given -> id, every spelling is normalized only once
+        self._interned: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+        # (country, province, city) as stored -> id
+        self._keys: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _grow(self, rows: int) -> None:
+        capacity = len(next(iter(self.series.values())))
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 16)
+        for metric, matrix in self.series.items():
+            grown = np.zeros((capacity, self.dates), dtype=matrix.dtype)
+            grown[:len(matrix)] = matrix
+            self.series[metric] = grown
+
+    def _add(self, country: str, province: Optional[str], city: Optional[str], name: str, parent: int) -> int:
+        id = len(self.records)
+        record = RegionRecord(id, country, province, city, name, parent)
+        self.records.append(record)
+        (self.roots if parent == NO_PARENT else self.records[parent].children).append(id)
+        self._grow(id + 1)
+        self._keys[(country, province, city)] = id
+        return id
+
+    def _child(self, parent: int, country: str, province: Optional[str], city: Optional[str], name: str) -> int:
+        id = self._keys.get((country, province, city))
+        return self._add(country, province, city, name, parent) if id is None else id
+
+    def intern(self, country: str, province: Optional[str] = None, city: Optional[str] = None) -> int:
+        """
+        The id of the region, registered with its missing parents on first use
+        """
+        raw = (country, province, city)
+        id = self._interned.get(raw)
+        if id is not None:
+            return id
+
+        country = country.strip()
+        id = self._child(NO_PARENT, country, None, None, country)
+        if province is not None:
+            provinceName = province.strip()
+            id = self._child(id, country, provinceKey(country, provinceName), None, provinceName)
+            if city is not None:
+                city = city.strip()
+                id = self._child(id, country, self.records[id].province, city, city)
+
+        self._interned[raw] = id
+        return id
+
+    def set(self, id: int, **series: np.ndarray) -> None:
+        for metric, values in series.items():
+            self.series[metric][id] = values
+
+    def depthFirst(self) -> List[int]:
+        """
+        The ids of a country followed by its provinces each followed by its cities
+        """
+        order = []
+        stack = list(reversed(self.roots))
+        while stack:
+            id = stack.pop()
+            order.append(id)
+            stack.extend(reversed(self.records[id].children))
+        return order
+
+    def flat(self) -> Tuple[List[dict], Dict[str, np.ndarray]]:
+        """
+        The regions and the matrices of the storage backends, see storage.flatten(),
+        in depth first order. The matrices are copied once, only when the regions were
+        not registered in that order
+        """
+        order = np.array(self.depthFirst(), dtype=np.int64)
+        regions = [self.records[id].asDict() for id in order]
+        if np.array_equal(order, np.arange(len(order))):
+            return regions, {metric: matrix[:len(order)] for metric, matrix in self.series.items()}
+        return regions, {metric: matrix[order] for metric, matrix in self.series.items()}
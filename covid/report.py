@@ -1,159 +1,272 @@
 #!/usr/bin/env python3
 
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple, TYPE_CHECKING
 import logging
 import typer                     # https://typer.tiangolo.com
-from config import DB_DIR
-import json
-import matplotlib.pyplot as plt
+from config import DB_DIR, SMOOTH_WINDOW, RegionLevel, Smoothing, TableFormat
+import profiling
 from pathlib import Path
-from tabulate import tabulate    # https://pypi.org/project/tabulate/
 import math
+import re
+
+# numpy, matplotlib and tabulate are imported inside the commands so the CLI starts fast
+if TYPE_CHECKING:
+    from query import Store
 
 LOG = logging.getLogger(__name__)
-DB_PATH = DB_DIR / "db.json"
 
 app = typer.Typer()
 
 headers = ["idx", "Country", "Max", "Max-Day", "Today", "Deaths", "%Deaths", F"Last", "New Cases", "%growth", "Double\nDays"]
 
-COL_PERCENT_DEATHS = headers.index("%Deaths") - 1
-COL_LAST           = headers.index("Last") - 1
-COL_NEW_CASES      = headers.index("New Cases") - 1
-COL_PERCENT_GROWTH = headers.index("%growth") - 1
-COL_DOUBLE_DAYS    = headers.index("Double\nDays") - 1
-
-
-def __loadDB() -> Optional[dict]:
-    DB = None
-    if not DB_DIR.exists():
-        LOG(F"Cant find DB dir {DB_DIR}")
-    else:
-        try:
-            with open(DB_PATH, "r") as dbfile:
-                LOG.debug(F"Found db file: {DB_PATH}")
-                DB = json.load(dbfile)
-                LOG.debug("Loaded db")
-        except Exception as x:
-            LOG.info(F"Failed to parse DB: {x}")
-    return DB
-
-def _array2String(r):
-    r = list(r)
-
-    r[COL_LAST]           = ','.join([F"{s:>7}" for s in r[COL_LAST]])
-    r[COL_NEW_CASES]      = ','.join([F"{s:>7}" for s in r[COL_NEW_CASES]])
-    r[COL_PERCENT_GROWTH] = ', '.join([F"{s:>2.0f}" for s in r[COL_PERCENT_GROWTH]])
-    r[COL_DOUBLE_DAYS]    = ', '.join([F"{s:>3.0f}" for s in r[COL_DOUBLE_DAYS]])
-    return tuple(r)
 
-@app.command()
-def table( sort_col:str = typer.Option("Max", help="Select the column name to sort on"),
-           days:int = typer.Option(3, help="Show the last N days and N-1 New Cases"),
-           rows:int = typer.Option(0, help="The number of table rows to display")) :
-    """
-    Find country with the highest number of cases
-    """
-    DB = __loadDB()
+SNAPSHOT: Optional[int] = None
 
-    result = []
-    length = 0
+def __openStore() -> "Store":
+    from query import Store
 
+    if SNAPSHOT is not None:
+        store = Store.openSnapshot(SNAPSHOT, DB_DIR)
+        if store is None:
+            typer.echo(F"No snapshot {SNAPSHOT} in {DB_DIR}. List them with: covid world snapshots")
+            raise typer.Exit(1)
+        return store
 
-    for country, record in DB.items():
-        confirmed = record.get("confirmed",None)
-        deaths    = record.get("death", None)
-        if not confirmed:
-            LOG.info(F"Country {country} has no data")
-            continue
-        length = max(length, len(confirmed))
-        today_cases = confirmed[-1]
-        today_death = deaths[-1]
+    store = Store.open(DB_DIR)
+    if store is None:
+        typer.echo(F"No processed data found in {DB_DIR}. Run: covid world process")
+        raise typer.Exit(1)
+    return store
 
-        try:
-            percentDeaths = F"{100*today_death/today_cases:.0f}"
-        except ZeroDivisionError:
-            percentDeaths = "NaN"
+def dateWindow(store: "Store", start: Optional[str], end: Optional[str]) -> slice:
+    """
+    The columns of the --from / --to dates, exits on a malformed date
+    """
+    import datetime
+
+    for date in (start, end):
+        if date is not None:
+            try:
+                datetime.date.fromisoformat(date)
+            except ValueError:
+                typer.echo(F"Invalid date {date}, expected YYYY-MM-DD")
+                raise typer.Exit(1)
+
+    columns = store.dateSlice(start, end)
+    if columns.start >= columns.stop:
+        typer.echo(F"No data from {start or store.start} to {end or store.end}")
+        raise typer.Exit(1)
+    return columns
+
+# the metric sorted on for every column. Per day columns sort on the last day
+SORT_METRICS = {"Max": "max", "Max-Day": "maxDay", "Today": "today", "Deaths": "deaths", "%Deaths": "percentDeaths",
+                "Last": "cases", "New Cases": "diff", "%growth": "percent", "Double\nDays": "doubling"}
+
+def _record(name: str, m: dict, i: int) -> dict:
+    return {"country": name, "max": int(m["max"][i]), "maxDay": int(m["maxDay"][i]), "today": int(m["today"][i]),
+            "deaths": int(m["deaths"][i]), "percentDeaths": float(m["percentDeaths"][i]),
+            "cases": m["cases"][i].tolist(), "diff": m["diff"][i].tolist(),
+            "percent": m["percent"][i].tolist(), "doubling": m["doubling"][i].tolist()}
+
+def _formatRow(r: dict) -> tuple:
+    percentDeaths = r["percentDeaths"]
+    return (r["country"], r["max"], r["maxDay"], r["today"], r["deaths"],
+            "NaN" if math.isnan(percentDeaths) else F"{percentDeaths:.0f}",
+            ','.join([F"{s:>7}" for s in r["cases"]]),
+            ','.join([F"{s:>7.0f}" for s in r["diff"]]),
+            ', '.join([F"{s:>2.0f}" for s in r["percent"] if not math.isnan(s)]),
+            ', '.join([F"{s:>3.0f}" for s in r["doubling"] if not math.isnan(s)]))
+
+def _sortOrder(sort_col: str, names: List[str], m: dict, rows: int):
+    import numpy as np
+    import metrics
+
+    if sort_col == "Country":
+        order = np.array(sorted(range(len(names)), key=lambda i: names[i], reverse=True), dtype=np.int64)
+        return order[:rows] if rows > 0 else order
+
+    key = m[SORT_METRICS[sort_col]]
+    if key.ndim == 2:
+        key = key[:, -1] if key.shape[1] else np.zeros(len(key))
+    return metrics.topK(key, rows)
+
+def tableHeaders(sort_col_index: int, days: int) -> List[str]:
+    result = list(headers)
+    result[sort_col_index] = result[sort_col_index] + "*"
+    result[7] = result[7] + F" {days} days"
+    result[7] = result[7] + "\n"
 
-        max_cases = max(confirmed)
-        day_index = 1 + confirmed.index(max_cases)
+    for i in range(-days+1,1):
+        result[7] = result[7] + F"{i}      "
 
-        cases = confirmed[-days:]
-        diff = [cases[i + 1] - cases[i] for i in range(0, len(cases) - 1)]
-        percent = [ 100*(diff[i] / cases[i]) for i in range(0, len(diff)) if cases[i] != 0]
-        days_double = [ math.log10(2)/math.log10(1 + p/100.0) for p in percent if p != 0 ]
+    result[8] = result[8] + "\n"
+    for i in range(-days+2,1):
+        result[8] = result[8] + F"{i}      "
+    return result
 
-        result.append((country, max_cases, day_index, today_cases, today_death, percentDeaths, cases, diff, percent, days_double))
+def tableRecords(store: "Store", sort_col: str = "Max", days: int = 3, rows: int = 0,
+                 columns: slice = slice(None), smooth: Optional[Smoothing] = None,
+                 window: int = SMOOTH_WINDOW) -> Tuple[List[str], Iterator[dict]]:
+    """
+    Compute the table for all countries at once and return the headers and the (top) rows
+    as records, created one at a time. Only the dates of columns (see Store.dateSlice) are considered.
+    With smooth the new cases are smoothed and the growth is the average over the window.
+    """
+    import metrics
+    import smoothing
 
     try:
         sort_col_index = headers.index(sort_col)
-    except:
+    except ValueError:
         LOG.warning(F"Sort_col should match one of the following column names: {headers[1:]} defaulting to Max")
-        sort_col_index = 1
-
-    sortKey = sort_col_index - 1
-    if sortKey == COL_NEW_CASES:
-        result.sort(key=lambda tup: tup[sortKey][-1], reverse=True)
-    else:
-        result.sort(key=lambda tup: tup[sortKey], reverse=True)  # sorts in place
-
-    #result.append((country, max_cases, day_index, today_cases, ' '.join([str(s) for s in cases]), ' '.join([str(s) for s in diff])))
+        sort_col = "Max"
+        sort_col_index = headers.index(sort_col)
 
-    result = list(map(_array2String, result))
+    countries = store.countries()
+    names = store.names(countries)
+    # growth and doubling days are precomputed by world process, older stores only have the raw series
+    precomputed = {}
+    if smooth is not None:
+        # the days before --from fill the first windows
+        confirmed = store.matrix("confirmed", countries)[:, :columns.stop]
+        growth = smoothing.growthRate(confirmed, window)
+        precomputed = {"new": smoothing.smooth(metrics.newCases(confirmed), smooth, window)[:, columns],
+                       "growth": growth[:, columns], "doubling": metrics.doublingDays(growth)[:, columns]}
+    elif store.hasMetric("confirmed_growth") and store.hasMetric("confirmed_doubling"):
+        precomputed = {"growth": store.matrix("confirmed_growth", countries)[:, columns],
+                       "doubling": store.matrix("confirmed_doubling", countries)[:, columns]}
+    m = metrics.tableMetrics(store.matrix("confirmed", countries)[:, columns], store.matrix("death", countries)[:, columns],
+                             days, **precomputed)
+
+    order = _sortOrder(sort_col, names, m, rows)
+    return tableHeaders(sort_col_index, days), (_record(names[i], m, i) for i in order)
+
+def buildTable(store: "Store", sort_col: str = "Max", days: int = 3, rows: int = 0,
+               columns: slice = slice(None), smooth: Optional[Smoothing] = None,
+               window: int = SMOOTH_WINDOW) -> Tuple[List[str], List[tuple]]:
+    """
+    The headers and the formatted (top) rows of the table, see tableRecords
+    """
+    headers, records = tableRecords(store, sort_col, days, rows, columns, smooth, window)
+    return headers, [_formatRow(r) for r in records]
 
-    if rows > 0:
-        result = result[:rows]
+@app.command()
+def table( sort_col:str = typer.Option("Max", help="Select the column name to sort on"),
+           days:int = typer.Option(3, help="Show the last N days and N-1 New Cases"),
+           rows:int = typer.Option(0, help="The number of table rows to display"),
+           from_date:str = typer.Option(None, "--from", help="First date YYYY-MM-DD, defaults to the first date of the data"),
+           to_date:str = typer.Option(None, "--to", help="Last date YYYY-MM-DD, the table is computed as of this date"),
+           format:TableFormat = typer.Option(TableFormat.simple, help="Table format, csv and jsonl write one record per line"),
+           smooth:Smoothing = typer.Option(None, help="Smooth the new cases, the growth becomes the average daily growth over the window"),
+           window:int = typer.Option(SMOOTH_WINDOW, help="Days of the --smooth window")) :
+    """
+    Find country with the highest number of cases
+    """
+    import sys
+    import tableWriter
 
-    headers[sort_col_index] = headers[sort_col_index] + "*"
-    headers[7] = headers[7] + F" {days} days"
-    headers[7] = headers[7] + "\n"
+    store = __openStore()
+    columns = dateWindow(store, from_date, to_date)
 
-    for i in range(-days+1,1):
-        headers[7] = headers[7] + F"{i}      "
+    with profiling.span("table"):
+        headers, records = tableRecords(store, sort_col, days, rows, columns, smooth, window)
 
-    headers[8] = headers[8] + "\n"
-    for i in range(-days+2,1):
-        headers[8] = headers[8] + F"{i}      "
+    # rows are formatted and written one at a time
+    if format == TableFormat.jsonl:
+        tableWriter.writeJsonl(sys.stdout, records)
+        return
+    if format == TableFormat.csv:
+        tableWriter.writeCsv(sys.stdout, records)
+        return
 
     numberOfRows = str(rows) if rows != 0 else "all rows"
-    print(F"From date: {DB['metadata']['start']} to date: {DB['metadata']['end']}")
+    print(F"From date: {store.dates[columns.start]} to date: {store.dates[columns.stop - 1]}")
     print(F"Sort column: {sort_col} Number of Rows: {numberOfRows}")
+    if smooth is not None:
+        print(F"Smoothing: {smooth.value} over {window} days")
     print("")
-    print(tabulate(result,headers=headers, showindex=range(1, len(result)+1), floatfmt="0f"))
+    tableWriter.writeTable(sys.stdout, headers, (_formatRow(r) for r in records), format, floatfmt="0f")
 
-# file:Path = typer.Argument(None, file_okay=True,resolve_path=True,)
 @app.command()
-#def plot(countries: List[str], save : bool = typer.Option(False, help="save the plot using plot.png at the local directory")):
-def plot(countries: List[str], file : Path = typer.Option(None, file_okay=True,resolve_path=True, help="save the plot at the specified directory or specified file")):
-
+def alerts(new_above:float = typer.Option(None, help="Alert when the new cases of the day are above"),
+           doubling_below:float = typer.Option(None, help="Alert when the days to double at the growth of the last week are below"),
+           week_growth_above:float = typer.Option(None, help="Alert when the % growth of the new cases week over week is above"),
+           match_all:bool = typer.Option(False, help="Alert only when every rule matches, by default any rule does"),
+           level:RegionLevel = typer.Option(None, help="Scan only the regions of this level, by default every region"),
+           top:int = typer.Option(0, help="Only the N alerts with the most new cases"),
+           to_date:str = typer.Option(None, "--to", help="Scan as of this date YYYY-MM-DD, defaults to the last date of the data")):
     """
-    Plot confirmed cases and death of one or more countries.
-    Each series begins when the first confirmation is reported.
+    Print the regions matching the alert rules as json lines, see alerts.py
     """
+    import sys
+    import alerts as alerting
+    import storage
+    import tableWriter
+
+    rules = [alerting.Rule(metric, above, threshold) for metric, above, threshold in
+             (("new", True, new_above), ("doubling", False, doubling_below), ("week_growth", True, week_growth_above))
+             if threshold is not None]
+    if not rules:
+        typer.echo("No alert rule, use --new-above, --doubling-below or --week-growth-above")
+        raise typer.Exit(1)
+
+    store = __openStore()
+    columns = dateWindow(store, None, to_date)
+    levels = {RegionLevel.country: storage.LEVEL_COUNTRY, RegionLevel.province: storage.LEVEL_PROVINCE,
+              RegionLevel.city: storage.LEVEL_CITY}
+    rows = None if level is None else store.level(levels[level])
+
+    with profiling.span("alerts"):
+        count = tableWriter.writeJsonl(sys.stdout, alerting.scan(store, rules, rows, columns.stop, match_all, top))
+    profiling.count("alerts", count)
+
+def compareSeries(store: "Store", countries: List[str], columns: slice = slice(None),
+                  smooth: Optional[Smoothing] = None, window: int = SMOOTH_WINDOW) -> List[tuple]:
+    """
+    (country, confirmed, death) of the countries found within the columns (see Store.dateSlice).
+    Each series begins with the first case / death. With smooth the series of all the
+    countries are smoothed at once.
+    """
+    import numpy as np
+    import smoothing
 
-    DB = __loadDB()
-
-    result = []
-
-    for country in countries:
-        record = DB.get(country, None)
+    start = columns.start or 0
+    found = []
 
-        if record is None:
-            print(F"Country: {country} not found")
+    # every name is looked up at once, aliases and codes included (see regionIndex)
+    for country, row in zip(countries, store.lookup(countries)):
+        if row is None:
+            LOG.debug(F"Country: {country} not found")
             continue
+        # two names of the same region are plotted once
+        if row not in {r for _, r in found}:
+            found.append((store.names([row])[0], row))
+
+    rows = np.array([row for _, row in found], dtype=np.int64)
+    confirmed = store.matrix("confirmed", rows)
+    death = store.matrix("death", rows)
+    if smooth is not None and len(rows):
+        confirmed = smoothing.smooth(confirmed, smooth, window)
+        death = smoothing.smooth(death, smooth, window)
 
-        confirmed = record["confirmed"]
-        death    = record["death"]
-        firstNoneZero = confirmed.index(next(filter(lambda x: x > 0, confirmed)))
-        confirmed = confirmed[firstNoneZero :]
-        firstNoneZero = death.index(next(filter(lambda x: x > 0, death)))
-        death = death[firstNoneZero:]
+    result = []
+    for i, (country, row) in enumerate(found):
+        # the first case / death offsets are precomputed, a region without any starts at the beginning
+        firstNoneZero = max(int(store.first("confirmed", row)), start)
+        confirmedSeries = confirmed[i][firstNoneZero:columns.stop]
+        firstNoneZero = max(int(store.first("death", row)), start)
+        deathSeries = death[i][firstNoneZero:columns.stop]
 
 
-        result.append((country, confirmed, death))
+        result.append((country, confirmedSeries, deathSeries))
+    return result
 
-    fig, axs = plt.subplots(1, 2, figsize=(9, 4))
-    plt.suptitle(f"Compare {DB['metadata']['end']}", y = 1.05, weight="bold")
+def drawCompare(fig, store: "Store", result: List[tuple], end: str = None, subtitle: str = "") -> None:
+    """
+    Draw the comparison of the compareSeries result on a matplotlib figure
+    """
+    axs = fig.subplots(1, 2)
+    fig.suptitle(f"Compare {end or store.end}{subtitle}", y = 1.05, weight="bold")
 
     axs[0].set_title(f"Confirmed Cases")
     axs[0].set_ylabel(f"Infected")
@@ -174,23 +287,82 @@ def plot(countries: List[str], file : Path = typer.Option(None, file_okay=True,r
     # plt.yscale('log')
     # plt.xscale('log')
 
-    plt.tight_layout()
+def comparePng(store: "Store", result: List[tuple], end: str = None, subtitle: str = "") -> bytes:
+    """
+    The comparison plot as a png, from the plot cache when the same series were plotted before
+    """
+    from plotCache import PlotCache, cacheKey
+
+    end = end or store.end
+    series = [s for r in result for s in r[1:]]
+    key = cacheKey("compare", series, {"countries": [r[0] for r in result], "end": end, "subtitle": subtitle})
+
+    def draw() -> bytes:
+        from io import BytesIO
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(9, 4))
+        FigureCanvasAgg(fig)
+        drawCompare(fig, store, result, end, subtitle)
+        fig.tight_layout()
+
+        out = BytesIO()
+        fig.savefig(out, format="png", bbox_inches='tight')
+        return out.getvalue()
+
+    return PlotCache().render(key, draw)
+
+# file:Path = typer.Argument(None, file_okay=True,resolve_path=True,)
+@app.command()
+#def plot(countries: List[str], save : bool = typer.Option(False, help="save the plot using plot.png at the local directory")):
+def plot(countries: List[str], file : Path = typer.Option(None, file_okay=True,resolve_path=True, help="save the plot at the specified directory or specified file"),
+         from_date:str = typer.Option(None, "--from", help="First date YYYY-MM-DD, defaults to the first date of the data"),
+         to_date:str = typer.Option(None, "--to", help="Last date YYYY-MM-DD, defaults to the last date of the data"),
+         smooth:Smoothing = typer.Option(None, help="Smooth the confirmed cases and deaths"),
+         window:int = typer.Option(SMOOTH_WINDOW, help="Days of the --smooth window")):
+
+    """
+    Plot confirmed cases and death of one or more countries.
+    Each series begins when the first confirmation is reported.
+    """
+
+    store = __openStore()
+    columns = dateWindow(store, from_date, to_date)
+    endDate = store.dates[columns.stop - 1]
+
+    result = compareSeries(store, countries, columns, smooth, window)
+    subtitle = F" ({smooth.value} {window} days)" if smooth is not None else ""
+    rows = store.lookup(countries)
+    for country, row in zip(countries, rows):
+        if row is None:
+            suggestions = store.suggest(country)
+            print(F"Country: {country} not found" + (F", did you mean: {', '.join(suggestions)}" if suggestions else ""))
+
     if file:
         if file.is_dir():
-            # sort the countries join them with '_' and replace spaces with '-'
-            countries_string = '_'.join(sorted(countries)).replace(' ','-')
-            #countries_string = countries_string.replace(' ','-')
+            # the labels of the regions found (US/WA rather than what was typed, each once) sorted and joined
+            # with '_', path separators and spaces replaced with '-'
+            labels = sorted({store.nameIndex.labels[row] for row in rows if row is not None})
+            countries_string = re.sub(r"[\\/\s]+", "-", '_'.join(labels))
 
-            endDate = DB['metadata']['end']
             file = file / F"{endDate}_{countries_string}.png"
 
-        plt.tight_layout()
-        plt.savefig(str(file), bbox_inches='tight')
+        # identical series and options are served from the plot cache without matplotlib
+        file.write_bytes(comparePng(store, result, endDate, subtitle))
+        return
+
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(9, 4))
+    drawCompare(fig, store, result, endDate, subtitle)
+    plt.tight_layout()
     plt.show()
 
 # This is the main application: add CLI Parameters for the main CLI Application her
 @app.callback()
-def main(ctx: typer.Context):
+def main(ctx: typer.Context,
+         snapshot: int = typer.Option(None, help="Report the data as of this snapshot of the history, see world snapshots")):
     """
         This CLI generates reports:
 
@@ -199,6 +371,8 @@ def main(ctx: typer.Context):
         - plots comparing countries
     """
     LOG.debug(F"COVIDAP: executing command: {ctx.invoked_subcommand}")
+    global SNAPSHOT
+    SNAPSHOT = snapshot
 
 if __name__ == '__main__':
     logging.basicConfig(
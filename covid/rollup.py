@@ -0,0 +1,93 @@
+"""
+  Rollup of the region hierarchy: country > province > city.
+
+  A region that has no row of its own in the time series gets the sum of its
+  children: a province reported only by its cities, a country reported only by
+  its provinces (e.g. Canada, China, Australia). A region that is reported
+  keeps its own row, so cities of a reported state are not counted twice.
+
+  Every level is computed with one segmented reduction (np.add.reduceat) over
+  the rows sorted by their parent, whatever the number of countries.
+"""
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from engine import Region
+from us_state_abbreviation import us_state_abbrev
+
+LOG = logging.getLogger(__name__)
+
+
+class Rollup(NamedTuple):
+    regions: List[Region]
+    confirmed: np.ndarray
+    death: np.ndarray
+
+
+def provinceKey(country: str, province: Optional[str]) -> Optional[str]:
+    """
+    The name a province is stored under: US states by their abbreviation
+    """
+    if not isinstance(province, str):
+        return None
+    province = province.strip()
+    if country.strip() == 'US':
+        return us_state_abbrev.get(province.lower(), province)
+    return province
+
+
+def segmentSum(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum the rows of values that share a key. keys is an (n, k) integer array,
+    returns the distinct keys and the sum of their rows.
+    """
+    if len(keys) == 0:
+        return keys, values[:0]
+    order = np.lexsort(keys.T[::-1])
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    return keys[starts], np.add.reduceat(values[order], starts, axis=0)
+
+
+def rollup(regions: List[Region], confirmed: np.ndarray, death: np.ndarray) -> Rollup:
+    """
+    The aggregate rows of the regions that are missing from the time series.
+    regions, confirmed and death are aligned: one region per row.
+    """
+    if not regions:
+        return Rollup([], confirmed[:0], death[:0])
+
+    countries = np.array([r.country.strip() for r in regions], dtype=object)
+    provinces = np.array([provinceKey(r.country, r.province) or "" for r in regions], dtype=object)
+    level = np.array([0 if r.province is None else 1 if r.city is None else 2 for r in regions])
+
+    countryNames, countryCodes = np.unique(countries.astype(str), return_inverse=True)
+    provinceNames, provinceCodes = np.unique(provinces.astype(str), return_inverse=True)
+
+    # confirmed and death are reduced together
+    width = confirmed.shape[1]
+    values = np.concatenate([confirmed, death], axis=1).astype(np.int64)
+    keys = np.stack([countryCodes, provinceCodes], axis=1)
+
+    # cities -> provinces that have no row of their own
+    reported = {tuple(k) for k in keys[level == 1]}
+    cityKeys, citySums = segmentSum(keys[level == 2], values[level == 2])
+    missing = np.array([tuple(k) not in reported for k in cityKeys], dtype=bool)
+    provinceKeys, provinceSums = cityKeys[missing], citySums[missing]
+
+    # provinces, reported or rolled up -> countries that have no row of their own
+    reported = set(countryCodes[level == 0])
+    stateKeys = np.concatenate([keys[level == 1], provinceKeys])[:, :1]
+    stateSums = np.concatenate([values[level == 1], provinceSums])
+    countryKeys, countrySums = segmentSum(stateKeys, stateSums)
+    missing = np.array([k[0] not in reported for k in countryKeys], dtype=bool)
+    countryKeys, countrySums = countryKeys[missing], countrySums[missing]
+
+    result = [Region(countryNames[c], None, None, countryNames[c]) for c, in countryKeys]
+    result += [Region(countryNames[c], provinceNames[p], None, F"{countryNames[c]}_{provinceNames[p]}") for c, p in provinceKeys]
+    sums = np.concatenate([countrySums, provinceSums])
+
+    LOG.info(F"Rolled up {len(countryKeys)} countries and {len(provinceKeys)} provinces")
+    return Rollup(result, sums[:, :width], sums[:, width:])
@@ -0,0 +1,224 @@
+"""
+  Long running query server for the processed world data.
+
+  A small asyncio HTTP/JSON server that keeps the store open between requests:
+
+    GET /table?sort_col=Max&days=3&rows=10[&from=YYYY-MM-DD][&to=YYYY-MM-DD]
+                                                records of the report table, see report.tableRecords
+    GET /series?country=Canada[&province=..][&city=..]
+                                                dates, confirmed and death of a region
+    GET /plot.png?country=Canada&country=US     report plot as a png
+
+  Regions are looked up as by the report commands (aliases, US states, any
+  case). A region that is not found is a 404 with suggestions.
+
+  Rendered plots are kept in an in-memory LRU cache in front of the on-disk
+  plot cache (see plotCache). The store is reopened, and the caches
+  cleared, when world process writes a new database.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import storage
+import tableWriter
+from config import DB_DIR, SERVE_PLOT_CACHE
+from query import Store
+import report
+
+LOG = logging.getLogger(__name__)
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str, **details):
+        super().__init__(message)
+        self.status = status
+        # added to the json body of the error, e.g. suggestions
+        self.details = details
+
+
+class LRUCache:
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class DataServer:
+
+    def __init__(self, dbDir: Path = DB_DIR, cacheSize: int = SERVE_PLOT_CACHE):
+        self.dbDir = dbDir
+        self.store: Optional[Store] = None
+        self.version = None
+        self.plots = LRUCache(cacheSize)
+        # matplotlib renders one figure at a time, off the event loop
+        self.renderer = ThreadPoolExecutor(max_workers=1)
+
+    def _version(self):
+        """
+        The state of every file a store can be opened from. The sqlite history is
+        written through its WAL, which changes before the database file does
+        """
+        history = storage.SqliteBackend(self.dbDir).path
+        version = []
+        for target in (self.dbDir / "world" / storage.INDEX_FILE, storage.JsonBackend(self.dbDir).path,
+                       history, history.with_name(history.name + "-wal")):
+            try:
+                stat = target.stat()
+                version.append((str(target), stat.st_mtime_ns, stat.st_ino, stat.st_size))
+            except OSError:
+                pass
+        return tuple(version) or None
+
+    def reload(self) -> Store:
+        """
+        Reopen the store when world process wrote a new database
+        """
+        version = self._version()
+        if self.store is None or version != self.version:
+            store = Store.open(self.dbDir)
+            if store is None:
+                raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, F"No processed data in {self.dbDir}")
+            LOG.info(F"Loaded data {store.start} to {store.end}")
+            self.store, self.version = store, version
+            self.plots.clear()
+        return self.store
+
+    def table(self, params: dict) -> dict:
+        sortCol = _one(params, "sort_col", "Max")
+        if sortCol not in report.SORT_METRICS and sortCol != "Country":
+            raise HttpError(HTTPStatus.BAD_REQUEST, F"sort_col should be one of {report.headers[1:]}")
+        days = _int(params, "days", 3, minimum=1)
+        rows = _int(params, "rows", 0, minimum=0)
+
+        store = self.reload()
+        columns = store.dateSlice(_one(params, "from"), _one(params, "to"))
+        if columns.start >= columns.stop:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "no data in the date range")
+        _, records = report.tableRecords(store, sortCol, days, rows, columns)
+        return {"start": store.dates[columns.start], "end": store.dates[columns.stop - 1], "sort_col": sortCol,
+                "rows": [tableWriter.plainRecord(r) for r in records]}
+
+    def series(self, params: dict) -> dict:
+        store = self.reload()
+        country = _one(params, "country")
+        if country is None:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "country is required")
+        # the names are looked up as the report commands do: aliases, US states, any case
+        name = "/".join(part for part in (country, _one(params, "province"), _one(params, "city")) if part)
+        row = store.lookup([name])[0]
+        if row is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, F"{name} not found", suggestions=store.suggest(name))
+        return {"name": store.names([row])[0], "dates": store.dates,
+                "confirmed": store.series(row, "confirmed").tolist(), "death": store.series(row, "death").tolist()}
+
+    async def plot(self, params: dict) -> bytes:
+        store = self.reload()
+        countries = params.get("country", [])
+        if not countries:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "at least one country is required")
+        rows = store.lookup(countries)
+        if all(row is None for row in rows):
+            raise HttpError(HTTPStatus.NOT_FOUND, F"{', '.join(countries)} not found",
+                            suggestions={country: store.suggest(country) for country in countries})
+
+        # the names of a region (US, usa) share their plot, a name that is not found is left out as by report plot
+        key = tuple(dict.fromkeys(row for row in rows if row is not None))
+        png = self.plots.get(key)
+        if png is None:
+            png = await asyncio.get_running_loop().run_in_executor(self.renderer, renderCompare, store, list(countries))
+            self.plots.put(key, png)
+        return png
+
+    async def route(self, path: str, params: dict) -> Tuple[str, bytes]:
+        if path == "/table":
+            return "application/json", json.dumps(self.table(params)).encode()
+        if path == "/series":
+            return "application/json", json.dumps(self.series(params)).encode()
+        if path == "/plot.png":
+            return "image/png", await self.plot(params)
+        raise HttpError(HTTPStatus.NOT_FOUND, F"Unknown path {path}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            requestLine = (await reader.readline()).decode("latin-1").split()
+            # skip the headers, requests have no body
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            try:
+                if len(requestLine) < 2 or requestLine[0] != "GET":
+                    raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Only GET is supported")
+                url = urlsplit(requestLine[1])
+                contentType, body = await self.route(url.path, parse_qs(url.query))
+                status = HTTPStatus.OK
+            except HttpError as x:
+                status, contentType, body = x.status, "application/json", json.dumps({"error": str(x), **x.details}).encode()
+            except Exception as x:
+                LOG.exception(x)
+                status, contentType, body = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json", json.dumps({"error": str(x)}).encode()
+
+            writer.write(F"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                         F"Content-Type: {contentType}\r\n"
+                         F"Content-Length: {len(body)}\r\n"
+                         F"Connection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        self.reload()
+        server = await asyncio.start_server(self.handle, host, port)
+        LOG.info(F"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def _one(params: dict, name: str, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def _int(params: dict, name: str, default: int, minimum: int) -> int:
+    value = _one(params, name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, F"{name} should be an integer")
+    if value < minimum:
+        raise HttpError(HTTPStatus.BAD_REQUEST, F"{name} should be at least {minimum}")
+    return value
+
+
+def renderCompare(store: Store, countries) -> bytes:
+    return report.comparePng(store, report.compareSeries(store, countries))
+
+
+def run(host: str, port: int, dbDir: Path = DB_DIR):
+    try:
+        asyncio.run(DataServer(dbDir).serve(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,102 @@
+"""
+  Vectorized smoothing over region x date matrices.
+
+  Like metrics, every function takes a whole matrix (one row per region, a 1-D
+  series is a single region) and smooths all the regions in one call:
+
+    rollingMean   trailing mean, NaN until the window is full
+    centeredMean  mean of the window centered on the day, NaN where it is not full
+    ewma          exponentially weighted mean, alpha = 2 / (window + 1)
+    growthRate    average daily % growth of a cumulative series over the window
+
+  The report and ottawa commands select one with --smooth and --window:
+
+    smooth(newCases, Smoothing.centered, 7)
+"""
+import logging
+from typing import Callable, Dict
+
+import numpy as np
+
+from config import Smoothing
+
+LOG = logging.getLogger(__name__)
+
+
+def rollingMean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over window days using a cumulative sum. NaN until the window is full
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    if window < 1 or values.shape[-1] < window:
+        return result
+    total = np.cumsum(values, axis=-1)
+    result[..., window - 1] = total[..., window - 1]
+    result[..., window:] = total[..., window:] - total[..., :-window]
+    result[..., window - 1:] /= window
+    return result
+
+
+def centeredMean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean over the window centered on every day, an even window has one more day before
+    the day than after (as pandas). NaN at both ends where the window is not full
+    """
+    trailing = rollingMean(values, window)
+    shift = (window - 1) // 2
+    if shift == 0:
+        return trailing
+    result = np.full(trailing.shape, np.nan)
+    result[..., :-shift] = trailing[..., shift:]
+    return result
+
+
+def ewma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Exponentially weighted mean with the decay of a window days span, started at the
+    first day. A NaN day keeps the previous mean
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(values.shape)
+    if values.shape[-1] == 0:
+        return result
+    alpha = 2.0 / (max(window, 1) + 1)
+
+    # the recursion runs along the dates, each step is one operation over every region
+    mean = values[..., 0].copy()
+    result[..., 0] = mean
+    for day in range(1, values.shape[-1]):
+        value = values[..., day]
+        mean = np.where(np.isnan(value), mean, np.where(np.isnan(mean), value, mean + alpha * (value - mean)))
+        result[..., day] = mean
+    return result
+
+
+def growthRate(cumulative: np.ndarray, window: int = 7) -> np.ndarray:
+    """
+    Average daily growth in percent over the last window days of a cumulative series,
+    comparable to metrics.growthSeries. NaN for the first window days and where the
+    count window days before is 0
+    """
+    cumulative = np.asarray(cumulative, dtype=np.float64)
+    result = np.full(cumulative.shape, np.nan)
+    if window < 1 or cumulative.shape[-1] <= window:
+        return result
+    now = cumulative[..., window:]
+    before = cumulative[..., :-window]
+    ratio = np.divide(now, before, out=np.full(now.shape, np.nan), where=before > 0)
+    with np.errstate(invalid='ignore'):
+        result[..., window:] = 100 * (np.power(ratio, 1.0 / window) - 1)
+    return result
+
+
+SMOOTHERS: Dict[Smoothing, Callable[[np.ndarray, int], np.ndarray]] = {
+    Smoothing.rolling: rollingMean,
+    Smoothing.centered: centeredMean,
+    Smoothing.ewma: ewma,
+}
+
+
+def smooth(values: np.ndarray, method: Smoothing, window: int) -> np.ndarray:
+    return SMOOTHERS[Smoothing(method)](values, window)
@@ -0,0 +1,216 @@
+"""
+  Data source adapters.
+
+  A source fetches its raw files, parses them into the normalized confirmed and
+  death TimeSeries (see ingest: one row per region, one column per date) and
+  describes itself with its metadata:
+
+    jhu-global : john hopkins global time series (countries and provinces)
+    jhu-us     : john hopkins US time series (counties)
+    ottawa     : Ottawa public health page (the city of Ottawa, confirmed only)
+
+  Sources are fetched and parsed concurrently, then merged on one date axis so
+  world process runs the same processing and storage path whatever the sources.
+
+    confirmed, death, metadata = load(getSources([SourceName.jhuGlobal, SourceName.ottawa]))
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import getData
+import ingest
+from ingest import TimeSeries
+from config import CSV_CHUNKSIZE, CSV_SPILL_DIR, INDATADIR, OTTAWA_HTML_PATH, OTTAWA_URL, SourceName
+
+LOG = logging.getLogger(__name__)
+
+
+class SourceData(NamedTuple):
+    confirmed: TimeSeries
+    death: TimeSeries
+    metadata: dict
+
+
+class Source:
+    name = None
+
+    def files(self) -> List[Path]:
+        raise NotImplementedError
+
+    def fetch(self) -> bool:
+        """
+        Fetch the raw files, return False when a file could not be fetched
+        """
+        raise NotImplementedError
+
+    def parse(self) -> SourceData:
+        raise NotImplementedError
+
+    def metadata(self, confirmed: TimeSeries) -> dict:
+        return {"name": self.name.value, "files": [str(f) for f in self.files()], "regions": len(confirmed),
+                "start": confirmed.dates[0] if confirmed.dates else None,
+                "end": confirmed.dates[-1] if confirmed.dates else None}
+
+
+class JhuSource(Source):
+    downloads: List[Tuple[str, Path]] = []
+
+    def files(self) -> List[Path]:
+        return [path for _, path in self.downloads]
+
+    def fetch(self) -> bool:
+        return getData.get(self.downloads)
+
+    def spill(self, path: Path) -> Optional[Path]:
+        """
+        The memory-mapped count file of a csv file, None to read the counts in memory
+        """
+        if CSV_SPILL_DIR is None:
+            return None
+        CSV_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+        return CSV_SPILL_DIR / F"{self.name.value}-{path.stem}.counts"
+
+    def parse(self) -> SourceData:
+        confirmedPath, deathPath = self.files()
+        confirmed = ingest.readTimeSeries(confirmedPath, chunksize=CSV_CHUNKSIZE, spill=self.spill(confirmedPath))
+        death = ingest.readTimeSeries(deathPath, chunksize=CSV_CHUNKSIZE, spill=self.spill(deathPath))
+        return SourceData(confirmed, death, self.metadata(confirmed))
+
+
+class JhuGlobal(JhuSource):
+    name = SourceName.jhuGlobal
+
+    @property
+    def downloads(self):
+        return getData.DOWNLOADS
+
+
+class JhuUs(JhuSource):
+    name = SourceName.jhuUs
+
+    @property
+    def downloads(self):
+        return getData.US_DOWNLOADS
+
+
+class OttawaPhu(Source):
+    name = SourceName.ottawa
+
+    COUNTRY, PROVINCE, CITY = "Canada", "Ontario", "Ottawa"
+    LAT, LON = 45.42, -75.70
+
+    def files(self) -> List[Path]:
+        return [OTTAWA_HTML_PATH]
+
+    def fetch(self) -> bool:
+        import ottawa
+
+        INDATADIR.mkdir(parents=True, exist_ok=True)
+        return ottawa.getOttawaData(OTTAWA_HTML_PATH) is not None
+
+    def parse(self) -> SourceData:
+        import ottawa
+
+        dates, totals = ottawa.parseOttawaSeries(OTTAWA_HTML_PATH)
+
+        def series(counts) -> TimeSeries:
+            return TimeSeries(countries=np.array([self.COUNTRY], dtype=object), provinces=np.array([self.PROVINCE], dtype=object),
+                              cities=np.array([self.CITY], dtype=object), lat=np.array([self.LAT], dtype=np.float32),
+                              lon=np.array([self.LON], dtype=np.float32), counts=counts, columns=_columns(dates), dates=dates)
+
+        confirmed = series(np.array([totals], dtype=np.int32))
+        # the page only reports confirmed cases
+        death = series(np.zeros((1, len(dates)), dtype=np.int32))
+        metadata = self.metadata(confirmed)
+        metadata["url"] = OTTAWA_URL
+        return SourceData(confirmed, death, metadata)
+
+
+SOURCES = {cls.name: cls for cls in (JhuGlobal, JhuUs, OttawaPhu)}
+
+
+def getSources(names: Iterable[SourceName]) -> List[Source]:
+    return [SOURCES[SourceName(name)]() for name in dict.fromkeys(names)]
+
+
+def _columns(dates: List[str]) -> List[str]:
+    return [datetime.datetime.strptime(d, "%Y-%m-%d").strftime(ingest.DATE_FORMAT) for d in dates]
+
+
+def fetchSources(sources: List[Source]) -> Dict[str, bool]:
+    """
+    Fetch every source concurrently, return whether each one succeeded
+    """
+    def run(source: Source) -> bool:
+        try:
+            return source.fetch()
+        except Exception as x:
+            LOG.exception(x)
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as pool:
+        return {source.name.value: ok for source, ok in zip(sources, pool.map(run, sources))}
+
+
+def parseSources(sources: List[Source]) -> List[SourceData]:
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as pool:
+        return list(pool.map(lambda source: source.parse(), sources))
+
+
+def _align(ts: TimeSeries, dates: List[str], position: Dict[str, int]) -> np.ndarray:
+    """
+    The counts of ts on the dates axis. The cumulative counts are 0 before the first
+    date of the source and carried forward over the dates it does not report.
+    """
+    known = np.zeros(len(dates), dtype=bool)
+    columns = [position[d] for d in ts.dates]
+    known[columns] = True
+
+    spread = np.zeros((len(ts), len(dates) + 1), dtype=np.int32)
+    spread[:, np.array(columns, dtype=np.int64) + 1] = ts.counts
+    # index of the last known column for every date, 0 (the zero column) before the first
+    last = np.maximum.accumulate(np.where(known, np.arange(1, len(dates) + 1), 0))
+    return spread[:, last]
+
+
+def _concat(series: List[TimeSeries], dates: List[str]) -> TimeSeries:
+    position = {date: i for i, date in enumerate(dates)}
+    hasCities = any(ts.cities is not None for ts in series)
+
+    def cities(ts):
+        return ts.cities if ts.cities is not None else np.full(len(ts), None, dtype=object)
+
+    return TimeSeries(countries=np.concatenate([ts.countries for ts in series]),
+                      provinces=np.concatenate([ts.provinces for ts in series]),
+                      cities=np.concatenate([cities(ts) for ts in series]) if hasCities else None,
+                      lat=np.concatenate([ts.lat for ts in series]),
+                      lon=np.concatenate([ts.lon for ts in series]),
+                      counts=np.concatenate([_align(ts, dates, position) for ts in series]),
+                      columns=_columns(dates), dates=dates)
+
+
+def merge(data: List[SourceData]) -> Tuple[TimeSeries, TimeSeries]:
+    """
+    One confirmed and one death TimeSeries holding the rows of every source on the
+    union of their dates. A region reported by more than one source is stored
+    from the last one.
+    """
+    if len(data) == 1:
+        return data[0].confirmed, data[0].death
+
+    dates = sorted(set().union(*(d.confirmed.dates for d in data), *(d.death.dates for d in data)))
+    return _concat([d.confirmed for d in data], dates), _concat([d.death for d in data], dates)
+
+
+def load(sources: List[Source]) -> Tuple[TimeSeries, TimeSeries, List[dict]]:
+    """
+    Parse the sources concurrently and merge them
+    """
+    data = parseSources(sources)
+    confirmed, death = merge(data)
+    return confirmed, death, [d.metadata for d in data]
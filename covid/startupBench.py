@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+"""
+  Startup time regression check for the covid CLI.
+
+  Measures, in fresh interpreters:
+    - the import time of the CLI modules and the modules they pull in (python -X importtime)
+    - the wall clock of: covid --help, covid world load, covid world report table
+
+  and fails (exit code 1) when a heavy dependency is imported just to build the
+  CLI, when a command fails or when a measurement exceeds its budget. Results are
+  printed as json.
+
+  The commands run in a fixture: a temporary COVID_ROOT processed from synthetic
+  john hopkins files (see benchmark.py), which world load fetches from a local
+  http server (COVID_JHU_URL). test_startup.py runs the check under pytest.
+
+    ./startupBench.py --runs 5
+"""
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import typer                     # https://typer.tiangolo.com
+
+LOG = logging.getLogger(__name__)
+
+HERE = Path(__file__).parent.resolve()
+COVID = str(HERE / "covid")
+
+# modules that must only be imported by the commands that need them
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "tabulate", "bs4", "requests")
+
+# wall clock budgets in seconds
+BUDGETS = {"import": 0.5, "--help": 1.0, "load": 1.0, "report table": 5.0}
+
+SCENARIOS = {
+    "--help": [COVID, "--help"],
+    "load": [COVID, "world", "load"],
+    "report table": [COVID, "world", "report", "table", "--rows", "10"],
+}
+
+# size of the fixture
+FIXTURE_REGIONS = 300
+FIXTURE_DAYS = 200
+
+app = typer.Typer()
+
+
+def heavyImports() -> List[str]:
+    code = F"import sys; sys.path.insert(0, {str(HERE)!r}); import world, ottawa; " \
+           F"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=str(HERE), check=True)
+    return out.stdout.split()
+
+
+def importTime() -> float:
+    """
+    Cumulative import time in seconds of the CLI modules
+    """
+    code = F"import sys; sys.path.insert(0, {str(HERE)!r}); import world, ottawa"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=str(HERE))
+    total = 0
+    for line in out.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() in ("world", "ottawa"):
+            total += int(parts[1])
+    return total / 1e6
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        LOG.debug(format % args)
+
+
+@contextmanager
+def fixture(regions: int = FIXTURE_REGIONS, days: int = FIXTURE_DAYS) -> Iterator[Dict[str, str]]:
+    """
+    The environment of the commands: a temporary root holding a processed db and the
+    url of a local http server serving its john hopkins files
+    """
+    import benchmark
+
+    with tempfile.TemporaryDirectory() as tmp:
+        served = Path(tmp) / "jhu"
+        served.mkdir()
+        benchmark.writeJhuCsv(served / "time_series_covid19_confirmed_global.csv", regions, days, seed=1)
+        benchmark.writeJhuCsv(served / "time_series_covid19_deaths_global.csv", regions, days, seed=3, scale=0.05)
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(served)))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            env = {**os.environ, "COVID_ROOT": str(Path(tmp) / "root"),
+                   "COVID_JHU_URL": F"http://127.0.0.1:{server.server_address[1]}"}
+            for args in ([COVID, "world", "load"], [COVID, "world", "process", "--no-plots"]):
+                run(args, env)
+            yield env
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def run(args: List[str], env: Dict[str, str]) -> None:
+    """
+    Run the command in a fresh interpreter, RuntimeError when it fails
+    """
+    out = subprocess.run([sys.executable] + args, capture_output=True, text=True, cwd=str(HERE), env=env)
+    if out.returncode != 0:
+        raise RuntimeError(F"{' '.join(args[1:])} exited with {out.returncode}: {(out.stderr or out.stdout).strip()[-500:]}")
+
+
+def wallClock(args: List[str], runs: int, env: Dict[str, str]) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(args, env)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def measure(runs: int = 3) -> dict:
+    """
+    The measurements, and the failures of the commands that did not run
+    """
+    results = {"heavy_imports": heavyImports(), "import": importTime(), "errors": []}
+    with fixture() as env:
+        for name, args in SCENARIOS.items():
+            try:
+                results[name] = wallClock(args, runs, env)
+            except RuntimeError as x:
+                results["errors"].append(str(x))
+    return results
+
+
+def failures(results: dict, budgetScale: float = 1.0) -> List[str]:
+    """
+    The heavy imports, the commands that failed and the measurements over their budget
+    """
+    result = [F"heavy modules imported at startup: {results['heavy_imports']}"] if results["heavy_imports"] else []
+    result += results["errors"]
+    for name, budget in BUDGETS.items():
+        if name in results and results[name] > budget * budgetScale:
+            result.append(F"{name}: {results[name]:.3f}s over the {budget * budgetScale:.3f}s budget")
+    return result
+
+
+@app.command()
+def main(runs: int = typer.Option(3, help="Runs per scenario, the median is reported"),
+         budget_scale: float = typer.Option(1.0, help="Multiply every budget, e.g. for slow CI runners")):
+    """
+    Measure the CLI startup and fail on a regression
+    """
+    results = measure(runs)
+    results["failures"] = failures(results, budget_scale)
+    print(json.dumps(results, indent=2))
+    if results["failures"]:
+        raise typer.Exit(1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s,%(msecs)d %(levelname)s: %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    app()
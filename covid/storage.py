@@ -0,0 +1,588 @@
+"""
+  Storage backends for the processed world database.
+
+  The processed data is a nested dict: country -> provinces -> cities, every
+  record holding its confirmed and death series, plus a 'metadata' entry with
+  the dates. Backends persist that dict:
+
+    json: the historical pretty printed db.json, kept as an export format
+    npy : a columnar directory, one 2-D int32 matrix per metric (region x date)
+          saved as .npy, index.json holding the dates once, regions.json with
+          the region records and a sorted key index (keys.npy, order.npy,
+          level.npy) so a region can be found without parsing regions.json.
+          Derived series (new cases, growth, doubling days, rolling averages,
+          see metrics.derived) are computed once and saved next to the raw ones,
+          as is the offset of every region's first case and first death.
+          Everything is memory-mapped on read, see query.Store. names.json and
+          trigrams.json index the names users type for a region, see regionIndex.
+    sqlite: history.sqlite, every vintage of the data. Each write is a snapshot
+          holding only the (region, date, metric) cells that changed since the
+          previous one and the regions removed, so any snapshot can be read back
+          as of its date. The latest series are kept whole, see SqliteBackend.
+"""
+import datetime
+import json
+import logging
+import shutil
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics as derivedMetrics
+from regionIndex import NAMES_FILE, TRIGRAMS_FILE, RegionIndex
+from config import DB_DIR, DbFormat, ROLLING_WINDOWS
+
+LOG = logging.getLogger(__name__)
+
+METRICS = ("confirmed", "death")
+INDEX_FILE = "index.json"
+REGIONS_FILE = "regions.json"
+KEY_SEPARATOR = "\x1f"
+
+# level of a region in the hierarchy
+LEVEL_COUNTRY  = 0
+LEVEL_PROVINCE = 1
+LEVEL_CITY     = 2
+
+
+def flatten(db: dict) -> Tuple[dict, List[dict], Dict[str, np.ndarray]]:
+    """
+    Turn the nested db into (metadata, regions, metrics). Regions are listed
+    depth first, a country followed by its provinces each followed by its cities.
+    """
+    regions = []
+    series = {metric: [] for metric in METRICS}
+
+    def add(record, country, province=None, city=None):
+        regions.append({"country": country, "province": province, "city": city, "name": record["name"]})
+        for metric in METRICS:
+            series[metric].append(record[metric])
+
+    for country, record in db.items():
+        if country == 'metadata':
+            continue
+        add(record, country)
+        for province, province_record in record.get("provinces", {}).items():
+            add(province_record, country, province)
+            for city, city_record in province_record.get("cities", {}).items():
+                add(city_record, country, province, city)
+
+    metadata = db.get('metadata', {})
+    dates = len(metadata.get("dates", []))
+    metrics = {metric: np.asarray(rows, dtype=np.int32).reshape(len(rows), dates) for metric, rows in series.items()}
+    return metadata, regions, metrics
+
+
+def unflatten(metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> dict:
+    """
+    Rebuild the nested db. The series are rows (views) of the metric matrices.
+    """
+    db = {'metadata': metadata}
+    for row, region in enumerate(regions):
+        record = {"name": region["name"]}
+        for metric, matrix in metrics.items():
+            record[metric] = matrix[row]
+
+        country, province, city = region["country"], region["province"], region["city"]
+        if province is None:
+            record["provinces"] = {}
+            db[country] = record
+        elif city is None:
+            record["cities"] = {}
+            db[country]["provinces"][province] = record
+        else:
+            db[country]["provinces"][province]["cities"][city] = record
+    return db
+
+
+def regionKey(country: str, province: Optional[str] = None, city: Optional[str] = None) -> str:
+    return KEY_SEPARATOR.join((country, province or "", city or ""))
+
+
+def keyIndex(regions: List[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the sorted region keys, the row of every sorted key and the level of every row
+    """
+    keys = np.array([regionKey(r["country"], r["province"], r["city"]) for r in regions], dtype=str)
+    order = np.argsort(keys, kind="stable").astype(np.int32)
+    levels = np.array([LEVEL_COUNTRY if r["province"] is None else LEVEL_PROVINCE if r["city"] is None else LEVEL_CITY
+                       for r in regions], dtype=np.int8)
+    return keys[order], order, levels
+
+
+class Backend:
+    name = None
+
+    def __init__(self, dbDir: Path = DB_DIR):
+        self.dbDir = dbDir
+
+    @property
+    def path(self) -> Path:
+        raise NotImplementedError
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def write(self, db: dict) -> int:
+        """
+        Persist the db and return the number of bytes written
+        """
+        return self.writeFlat(*flatten(db))
+
+    def writeFlat(self, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> int:
+        """
+        Persist the flattened db, see flatten(), and return the number of bytes written
+        """
+        raise NotImplementedError
+
+    def read(self) -> Optional[dict]:
+        raise NotImplementedError
+
+
+class JsonBackend(Backend):
+    name = DbFormat.json
+
+    def __init__(self, dbDir: Path = DB_DIR, fileName: str = "db.json"):
+        super().__init__(dbDir)
+        self.fileName = fileName
+
+    @property
+    def path(self) -> Path:
+        return self.dbDir / self.fileName
+
+    def write(self, db: dict) -> int:
+        self.dbDir.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as dbfile:
+            json.dump(db, dbfile, indent=2, default=lambda o: o.tolist())
+        return self.path.stat().st_size
+
+    def writeFlat(self, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> int:
+        return self.write(unflatten(metadata, regions, metrics))
+
+    def read(self) -> Optional[dict]:
+        with open(self.path, "r") as dbfile:
+            return json.load(dbfile)
+
+
+class NpyBackend(Backend):
+    name = DbFormat.npy
+
+    def __init__(self, dbDir: Path = DB_DIR, windows=ROLLING_WINDOWS):
+        super().__init__(dbDir)
+        self.windows = windows
+
+    @property
+    def path(self) -> Path:
+        return self.dbDir / "world"
+
+    def exists(self) -> bool:
+        return (self.path / INDEX_FILE).exists()
+
+    def writeFlat(self, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> int:
+        previous = self._appended(metadata, regions, metrics) if self.exists() else None
+        return writeColumnar(self.path, metadata, regions, withDerived(metrics, self.windows, previous))
+
+    def _appended(self, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """
+        (rows, metrics of the store replaced), rows[i] the row of the region i in that store when
+        the new series only appended dates to it, -1 for a new or revised one. None when the
+        dates of the store replaced are not the first new ones
+        """
+        oldMetadata, oldRegions, old = readColumnar(self.path)
+        oldDates = oldMetadata.get("dates", [])
+        if not oldDates or oldDates != metadata.get("dates", [])[:len(oldDates)] or any(m not in old for m in metrics):
+            return None
+
+        oldRows = {regionKey(r["country"], r["province"], r["city"]): row for row, r in enumerate(oldRegions)}
+        rows = np.array([oldRows.get(regionKey(r["country"], r["province"], r["city"]), -1) for r in regions], dtype=np.int64)
+        known = np.flatnonzero(rows >= 0)
+        for metric, matrix in metrics.items():
+            same = np.all(np.asarray(matrix)[known, :len(oldDates)] == old[metric][rows[known]], axis=1)
+            rows[known[~same]] = -1
+        return rows, old
+
+    def read(self) -> Optional[dict]:
+        metadata, regions, metrics = readColumnar(self.path)
+        return unflatten(metadata, regions, {metric: metrics[metric] for metric in METRICS})
+
+
+def withDerived(metrics: Dict[str, np.ndarray], windows=ROLLING_WINDOWS,
+                previous: Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]] = None) -> Dict[str, np.ndarray]:
+    """
+    Add the derived series of every cumulative metric. With the (rows, metrics) of a previous
+    store (see NpyBackend) the derived series of its rows are reused, only the dates appended
+    since are computed
+    """
+    result = dict(metrics)
+    for metric in METRICS:
+        if metric in metrics:
+            result.update(derivedMetrics.derived(metrics[metric], metric, windows) if previous is None
+                          else _extendDerived(np.asarray(metrics[metric]), metric, windows, *previous))
+    return result
+
+
+def _extendDerived(cumulative: np.ndarray, name: str, windows, rows: np.ndarray, old: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    start = old[name].shape[1]
+    # a derived value depends on the largest window of days before it at most
+    lookback = min(start, max(max(windows, default=1), 1))
+    reused, computed = np.flatnonzero(rows >= 0), np.flatnonzero(rows < 0)
+    full = derivedMetrics.derived(cumulative[computed], name, windows)
+    tail = derivedMetrics.derived(cumulative[reused, start - lookback:], name, windows)
+
+    result = {}
+    for key, values in full.items():
+        if key not in old:
+            # written with other windows
+            return derivedMetrics.derived(cumulative, name, windows)
+        matrix = np.empty(cumulative.shape[:1] + values.shape[1:], dtype=values.dtype)
+        matrix[computed] = values
+        if values.ndim == 1:
+            # the offset of the first case: kept, else found in the appended dates
+            first = old[key][rows[reused]]
+            matrix[reused] = np.where(first >= 0, first, np.where(tail[key] >= 0, tail[key] + start - lookback, -1))
+        else:
+            matrix[reused, :start] = old[key][rows[reused]]
+            matrix[reused, start:] = tail[key][:, lookback:]
+        result[key] = matrix
+    return result
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id       INTEGER PRIMARY KEY,
+    created  TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    cells    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS regions (
+    id       INTEGER PRIMARY KEY,
+    country  TEXT NOT NULL,
+    province TEXT NOT NULL,
+    city     TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    UNIQUE (country, province, city)
+);
+CREATE TABLE IF NOT EXISTS cells (
+    region   INTEGER NOT NULL REFERENCES regions(id),
+    metric   TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    snapshot INTEGER NOT NULL REFERENCES snapshots(id),
+    value    INTEGER NOT NULL,
+    PRIMARY KEY (region, metric, date, snapshot)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cells_snapshot ON cells (snapshot);
+CREATE INDEX IF NOT EXISTS cells_asof ON cells (metric, region, date, snapshot DESC);
+CREATE TABLE IF NOT EXISTS removed (
+    region   INTEGER NOT NULL REFERENCES regions(id),
+    snapshot INTEGER NOT NULL REFERENCES snapshots(id),
+    PRIMARY KEY (region, snapshot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest (
+    region   INTEGER NOT NULL REFERENCES regions(id),
+    metric   TEXT NOT NULL,
+    series   BLOB NOT NULL,
+    PRIMARY KEY (region, metric)
+) WITHOUT ROWID;
+"""
+
+# latest.series: the values of the region over the dates of the latest snapshot
+SQLITE_SERIES = np.dtype("<i4")
+
+# the value as of a snapshot of the (region, metric, date) cells written in the rows matching the
+# condition, NULL when the cell was added after it. A cell written several times comes once per
+# row. Each value is one lookup of the cells_asof index
+SQLITE_AS_OF = """
+SELECT region, metric, date, (
+    SELECT value FROM cells AS v INDEXED BY cells_asof
+    WHERE v.metric = k.metric AND v.region = k.region AND v.date = k.date AND v.snapshot <= :snapshot
+    ORDER BY v.snapshot DESC LIMIT 1)
+FROM cells AS k WHERE {condition}
+"""
+
+# the regions of a snapshot: written by then and not removed without being written again since
+SQLITE_REGIONS = """
+SELECT id, country, province, city, name FROM regions AS r
+WHERE EXISTS (SELECT 1 FROM cells WHERE region = r.id AND snapshot <= :snapshot)
+AND NOT EXISTS (SELECT 1 FROM removed AS m WHERE m.region = r.id AND m.snapshot <= :snapshot
+                AND NOT EXISTS (SELECT 1 FROM cells WHERE region = r.id AND snapshot > m.snapshot AND snapshot <= :snapshot))
+ORDER BY country, province, city
+"""
+
+
+class SqliteBackend(Backend):
+    """
+    Every snapshot adds the cells that changed since the previous one to cells, and
+    the regions that are no longer written to removed. latest holds the series of the
+    latest snapshot, one blob per region and metric: a write is diffed against it and
+    a read starts from it, looking up only the cells that changed after the snapshot read.
+    """
+    name = DbFormat.sqlite
+
+    def __init__(self, dbDir: Path = DB_DIR, fileName: str = "history.sqlite"):
+        super().__init__(dbDir)
+        self.fileName = fileName
+
+    @property
+    def path(self) -> Path:
+        return self.dbDir / self.fileName
+
+    def exists(self) -> bool:
+        return self.path.exists() and self.latest() is not None
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.path))
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SQLITE_SCHEMA)
+        return connection
+
+    def latest(self) -> Optional[int]:
+        with closing(self.connect()) as connection:
+            return connection.execute("SELECT MAX(id) FROM snapshots").fetchone()[0]
+
+    def snapshots(self) -> List[dict]:
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT id, created, metadata, cells FROM snapshots ORDER BY id").fetchall()
+        result = []
+        for id, created, metadata, cells in rows:
+            metadata = json.loads(metadata)
+            result.append({"snapshot": id, "created": created, "start": metadata.get("start"), "end": metadata.get("end"), "cells": cells})
+        return result
+
+    @staticmethod
+    def _dates(connection: sqlite3.Connection, snapshot: int) -> List[str]:
+        row = connection.execute("SELECT metadata FROM snapshots WHERE id = ?", (snapshot,)).fetchone()
+        return json.loads(row[0]).get("dates", [])
+
+    @staticmethod
+    def _asOf(connection: sqlite3.Connection, snapshot: int, condition: str, parameters: dict = None) -> List[tuple]:
+        """
+        The (region, metric, date, value) cells matching the condition as of snapshot, value None
+        for the cells added after it
+        """
+        return connection.execute(SQLITE_AS_OF.format(condition=condition), {**(parameters or {}), "snapshot": snapshot}).fetchall()
+
+    def _readLatest(self, connection: sqlite3.Connection, snapshot: int) -> Tuple[Dict[int, int], Dict[str, np.ndarray]]:
+        """
+        The rows (region id -> row) and the metric matrices of latest, filled from the cells
+        of the latest snapshot when the history was written before latest existed
+        """
+        dates = self._dates(connection, snapshot)
+        series = connection.execute("SELECT region, metric, series FROM latest ORDER BY region").fetchall()
+        if not series:
+            series = self._fillLatest(connection, snapshot, dates)
+
+        rows = {}
+        for region, _, _ in series:
+            rows.setdefault(region, len(rows))
+        matrices = {metric: np.zeros((len(rows), len(dates)), dtype=np.int32) for metric in METRICS}
+        for region, metric, values in series:
+            matrices[metric][rows[region]] = np.frombuffer(values, dtype=SQLITE_SERIES)
+        return rows, matrices
+
+    def _fillLatest(self, connection: sqlite3.Connection, snapshot: int, dates: List[str]) -> List[tuple]:
+        LOG.info(F"Filling the latest series from the cells of snapshot {snapshot}")
+        columns = {date: column for column, date in enumerate(dates)}
+        regions = [id for id, *_ in connection.execute(SQLITE_REGIONS, {"snapshot": snapshot})]
+        matrices = {metric: np.zeros((len(regions), len(dates)), dtype=np.int32) for metric in METRICS}
+        rows = {id: row for row, id in enumerate(regions)}
+        for region, metric, date, value in self._asOf(connection, snapshot, "1"):
+            if value is not None and region in rows and date in columns and metric in matrices:
+                matrices[metric][rows[region], columns[date]] = value
+        return self._writeLatest(connection, np.array(regions, dtype=np.int64), matrices)
+
+    @staticmethod
+    def _writeLatest(connection: sqlite3.Connection, ids: np.ndarray, metrics: Dict[str, np.ndarray]) -> List[tuple]:
+        series = [(id, metric, np.ascontiguousarray(metrics[metric][row], dtype=SQLITE_SERIES).tobytes())
+                  for row, id in enumerate(ids.tolist()) for metric in METRICS]
+        connection.execute("DELETE FROM latest")
+        connection.executemany("INSERT INTO latest (region, metric, series) VALUES (?, ?, ?)", series)
+        return series
+
+    def _regionIds(self, connection: sqlite3.Connection, regions: List[dict]) -> Dict[int, int]:
+        keys = [(r["country"], r["province"] or "", r["city"] or "", r["name"]) for r in regions]
+        connection.executemany("INSERT OR IGNORE INTO regions (country, province, city, name) VALUES (?, ?, ?, ?)", keys)
+        ids = {(country, province, city): id for id, country, province, city in
+               connection.execute("SELECT id, country, province, city FROM regions")}
+        return {ids[key[:3]]: row for row, key in enumerate(keys)}
+
+    def writeFlat(self, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> int:
+        """
+        Add a snapshot holding the cells that changed since the latest one and the regions
+        no longer written. Nothing is written when nothing changed.
+        """
+        dates = metadata.get("dates", [])
+        self.dbDir.mkdir(parents=True, exist_ok=True)
+
+        with closing(self.connect()) as connection:
+            # one transaction: a snapshot is written completely or not at all
+            with connection:
+                previous = connection.execute("SELECT MAX(id) FROM snapshots").fetchone()[0]
+                rows = self._regionIds(connection, regions)
+                ids = np.array(list(rows), dtype=np.int64)
+
+                removed = []
+                if previous is None:
+                    known = np.zeros((len(ids), len(dates)), dtype=bool)
+                else:
+                    oldRows, old = self._readLatest(connection, previous)
+                    oldColumns = {date: column for column, date in enumerate(self._dates(connection, previous))}
+                    r = np.array([oldRows.get(id, -1) for id in rows], dtype=np.int64)
+                    c = np.array([oldColumns.get(date, -1) for date in dates], dtype=np.int64)
+                    known = (r >= 0)[:, None] & (c >= 0)[None, :]
+                    removed = [id for id in oldRows if id not in rows]
+
+                changes = []
+                for metric in METRICS:
+                    new = np.asarray(metrics[metric])
+                    changed = ~known
+                    if known.any():
+                        changed |= old[metric][np.ix_(np.maximum(r, 0), np.maximum(c, 0))] != new
+                    rr, cc = np.nonzero(changed)
+                    changes.append((metric, ids[rr], cc, new[rr, cc]))
+
+                total = sum(len(r) for _, r, _, _ in changes)
+                if previous is not None and total == 0 and not removed:
+                    LOG.info("No cell changed since the latest snapshot")
+                    return 0
+
+                snapshot = connection.execute("INSERT INTO snapshots (created, metadata, cells) VALUES (?, ?, ?)",
+                                              (datetime.datetime.now().isoformat(timespec="seconds"), json.dumps(metadata), total)).lastrowid
+                for metric, region, column, value in changes:
+                    connection.executemany("INSERT INTO cells (region, metric, date, snapshot, value) VALUES (?, ?, ?, ?, ?)",
+                                           zip(region.tolist(), [metric] * len(region), [dates[c] for c in column.tolist()],
+                                               [snapshot] * len(region), value.tolist()))
+                connection.executemany("INSERT INTO removed (region, snapshot) VALUES (?, ?)", [(id, snapshot) for id in removed])
+                self._writeLatest(connection, ids, metrics)
+
+        LOG.info(F"Snapshot {snapshot}: {total} changed cells, {len(removed)} removed regions")
+        return self.path.stat().st_size
+
+    def read(self, snapshot: Optional[int] = None) -> Optional[dict]:
+        """
+        The db as of snapshot, the latest one by default. None when there is no such snapshot
+        """
+        with closing(self.connect()) as connection:
+            latest = connection.execute("SELECT MAX(id) FROM snapshots").fetchone()[0]
+            if snapshot is None:
+                snapshot = latest
+            row = connection.execute("SELECT metadata FROM snapshots WHERE id = ?", (snapshot,)).fetchone()
+            if row is None:
+                return None
+            metadata = json.loads(row[0])
+            dates = metadata.get("dates", [])
+
+            # the regions as of the snapshot, parents before their children
+            records = connection.execute(SQLITE_REGIONS, {"snapshot": snapshot}).fetchall()
+            regions = [{"country": country, "province": province or None, "city": city or None, "name": name}
+                       for _, country, province, city, name in records]
+            rows = {id: row for row, (id, *_) in enumerate(records)}
+
+            # start from the latest series, kept when they are filled for a history written before them...
+            with connection:
+                latestRows, latestMetrics = self._readLatest(connection, latest)
+            latestColumns = {date: column for column, date in enumerate(self._dates(connection, latest))}
+            r = np.array([latestRows.get(id, -1) for id in rows], dtype=np.int64)
+            c = np.array([latestColumns.get(date, -1) for date in dates], dtype=np.int64)
+            metrics = {}
+            for metric in METRICS:
+                values = latestMetrics[metric][np.ix_(np.maximum(r, 0), np.maximum(c, 0))]
+                values[(r < 0)[:, None] | (c < 0)[None, :]] = 0
+                metrics[metric] = values
+
+            # ...and look up the cells written after the snapshot, of the regions removed since
+            # and of the dates no longer in the latest one
+            if snapshot != latest:
+                cells = self._asOf(connection, snapshot, "snapshot > :snapshot")
+                gone = [id for id in rows if id not in latestRows]
+                if gone:
+                    cells += self._asOf(connection, snapshot, F"region IN ({','.join(map(str, gone))})")
+                missing = [date for date in dates if date not in latestColumns]
+                if missing:
+                    parameters = {F"date{i}": date for i, date in enumerate(missing)}
+                    cells += self._asOf(connection, snapshot, F"date IN ({','.join(':' + name for name in parameters)})", parameters)
+                columns = {date: column for column, date in enumerate(dates)}
+                for region, metric, date, value in cells:
+                    if region in rows and date in columns and metric in metrics:
+                        metrics[metric][rows[region], columns[date]] = 0 if value is None else value
+        return unflatten(metadata, regions, metrics)
+
+
+def writeColumnar(path: Path, metadata: dict, regions: List[dict], metrics: Dict[str, np.ndarray]) -> int:
+    """
+    Write the columnar store into a temporary directory and swap it in place so
+    readers never see a half written store.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(str(tmp))
+    tmp.mkdir(parents=True)
+
+    index = {"metadata": metadata, "metrics": list(metrics)}
+    with open(tmp / INDEX_FILE, "w") as indexfile:
+        json.dump(index, indexfile)
+    with open(tmp / REGIONS_FILE, "w") as regionsfile:
+        json.dump(regions, regionsfile)
+
+    # the name index of the report lookups, see regionIndex.py. It only depends on the regions:
+    # copied from the store replaced when they are the same
+    if all((path / name).exists() for name in (REGIONS_FILE, NAMES_FILE, TRIGRAMS_FILE)) and _readRegions(path) == regions:
+        for name in (NAMES_FILE, TRIGRAMS_FILE):
+            shutil.copyfile(str(path / name), str(tmp / name))
+    else:
+        RegionIndex.build(regions).write(tmp / NAMES_FILE, tmp / TRIGRAMS_FILE)
+
+    keys, order, levels = keyIndex(regions)
+    np.save(str(tmp / "keys.npy"), keys)
+    np.save(str(tmp / "order.npy"), order)
+    np.save(str(tmp / "level.npy"), levels)
+    for metric, matrix in metrics.items():
+        np.save(str(tmp / F"{metric}.npy"), matrix)
+
+    written = sum(f.stat().st_size for f in tmp.iterdir())
+
+    # an interrupted run may have left its old store behind
+    old = path.with_name(path.name + ".old")
+    if old.exists():
+        shutil.rmtree(str(old))
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    if old.exists():
+        shutil.rmtree(str(old))
+    return written
+
+
+def _readRegions(path: Path) -> List[dict]:
+    with open(path / REGIONS_FILE, "r") as regionsfile:
+        return json.load(regionsfile)
+
+
+def readColumnar(path: Path, mmap: bool = True) -> Tuple[dict, List[dict], Dict[str, np.ndarray]]:
+    with open(path / INDEX_FILE, "r") as indexfile:
+        index = json.load(indexfile)
+    regions = _readRegions(path)
+    mode = 'r' if mmap else None
+    metrics = {metric: np.load(str(path / F"{metric}.npy"), mmap_mode=mode) for metric in index["metrics"]}
+    return index["metadata"], regions, metrics
+
+
+BACKENDS = {DbFormat.npy: NpyBackend, DbFormat.json: JsonBackend, DbFormat.sqlite: SqliteBackend}
+
+
+def getBackend(fmt: DbFormat, dbDir: Path = DB_DIR, **options) -> Backend:
+    return BACKENDS[DbFormat(fmt)](dbDir, **options)
+
+
+def findBackend(dbDir: Path = DB_DIR) -> Optional[Backend]:
+    """
+    Return the first backend, in order of preference, that has a database in dbDir
+    """
+    for cls in BACKENDS.values():
+        backend = cls(dbDir)
+        if backend.exists():
+            return backend
+    return None
@@ -0,0 +1,195 @@
+"""
+  Streaming table output.
+
+  Rows are consumed from an iterator and written as they come instead of being
+  collected for tabulate. The column widths and alignments are taken from a
+  bounded sample of the first rows; a later, wider cell overflows its column.
+  A table that fits in the sample is handed to tabulate, so small tables look
+  exactly as before.
+
+  Line formats (plain, simple, github, pipe, orgtbl, psql, presto) are streamed,
+  the other tabulate formats (grid, html, latex, ...) need every row and fall
+  back to tabulate. csv and jsonl write one line per row for machine consumers.
+"""
+import csv
+import itertools
+import json
+import logging
+import math
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from config import TABLE_SAMPLE_ROWS
+
+LOG = logging.getLogger(__name__)
+
+MIN_PADDING = 2
+
+
+class Line(NamedTuple):
+    begin: str
+    fill: str
+    sep: str
+    end: str
+
+
+class LineFormat(NamedTuple):
+    row: Line                       # fill is unused
+    padding: int
+    rule: Optional[Line]            # below the header
+    border: Optional[Line] = None   # above and below the table
+    aligned: bool = False           # the rule marks the alignment of the columns (pipe)
+
+
+LINE_FORMATS = {
+    "plain":  LineFormat(Line("", "", "  ", ""), 0, None),
+    "simple": LineFormat(Line("", "", "  ", ""), 0, Line("", "-", "  ", "")),
+    "github": LineFormat(Line("|", "", "|", "|"), 1, Line("|", "-", "|", "|")),
+    "pipe":   LineFormat(Line("|", "", "|", "|"), 1, Line("|", "-", "|", "|"), aligned=True),
+    "orgtbl": LineFormat(Line("|", "", "|", "|"), 1, Line("|", "-", "+", "|")),
+    "psql":   LineFormat(Line("|", "", "|", "|"), 1, Line("|", "-", "+", "|"), Line("+", "-", "+", "+")),
+    "presto": LineFormat(Line("", "", "|", ""), 1, Line("", "-", "+", "")),
+}
+
+
+def _isNumber(cell) -> bool:
+    if isinstance(cell, bool):
+        return False
+    if isinstance(cell, (int, float)):
+        return True
+    try:
+        float(cell)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _text(cell) -> str:
+    # tabulate strips the cells before aligning them
+    return "" if cell is None else str(cell).strip()
+
+
+class StreamingTable:
+
+    def __init__(self, out: IO[str], headers: Sequence[str], sample: List[tuple], fmt: LineFormat):
+        self.out = out
+        self.fmt = fmt
+        columns = len(headers)
+        self.headers = [str(h).split("\n") for h in headers]
+        # like tabulate a column is at least 2 wider than its header
+        self.widths = [max([len(line) + MIN_PADDING for line in self.headers[c]] + [len(_text(row[c])) for row in sample])
+                       for c in range(columns)]
+        # a column is right aligned when every sampled value is a number, as tabulate does
+        self.right = [bool(sample) and all(_isNumber(row[c]) for row in sample if _text(row[c]) != "")
+                      for c in range(columns)]
+
+    def _line(self, line: Line) -> str:
+        pad = 2 * self.fmt.padding
+        cells = []
+        for width, right in zip(self.widths, self.right):
+            rule = line.fill * (width + pad)
+            if self.fmt.aligned and line is self.fmt.rule:
+                rule = rule[:-1] + ":" if right else ":" + rule[1:]
+            cells.append(rule)
+        return line.begin + line.sep.join(cells) + line.end
+
+    def _row(self, cells: Sequence[str]) -> str:
+        pad = " " * self.fmt.padding
+        row = self.fmt.row
+        text = [pad + (cell.rjust(width) if right else cell.ljust(width)) + pad
+                for cell, width, right in zip(cells, self.widths, self.right)]
+        line = row.begin + row.sep.join(text) + row.end
+        return line if row.end else line.rstrip()
+
+    def writeHeader(self) -> None:
+        if self.fmt.border:
+            self.out.write(self._line(self.fmt.border) + "\n")
+        height = max(len(lines) for lines in self.headers)
+        for i in range(height):
+            self.out.write(self._row([lines[i] if i < len(lines) else "" for lines in self.headers]) + "\n")
+        if self.fmt.rule:
+            self.out.write(self._line(self.fmt.rule) + "\n")
+
+    def writeRow(self, row: tuple) -> None:
+        self.out.write(self._row([_text(cell) for cell in row]) + "\n")
+
+    def close(self) -> None:
+        if self.fmt.border:
+            self.out.write(self._line(self.fmt.border) + "\n")
+
+
+def writeTable(out: IO[str], headers: Sequence[str], rows: Iterable[tuple], fmt: str = "simple",
+               showindex: bool = True, floatfmt: str = "g", sample: int = TABLE_SAMPLE_ROWS) -> int:
+    """
+    Write the rows in a tabulate format and return their number. With showindex
+    the first header names the 1 based row number column.
+    """
+    fmt = getattr(fmt, "value", fmt)
+    rows = iter(rows)
+    first = list(itertools.islice(rows, sample))
+    rest = next(rows, None)
+
+    if rest is None or fmt not in LINE_FORMATS:
+        from tabulate import tabulate    # https://pypi.org/project/tabulate/
+
+        if rest is not None:
+            LOG.warning(F"The {fmt} format can't be streamed, collecting every row")
+            first.append(rest)
+            first.extend(rows)
+        index = range(1, len(first) + 1) if showindex else False
+        out.write(tabulate(first, headers=headers, showindex=index, floatfmt=floatfmt, tablefmt=fmt) + "\n")
+        return len(first)
+
+    def numbered(rows, start):
+        return ((i,) + tuple(row) for i, row in enumerate(rows, start)) if showindex else rows
+
+    sampled = list(numbered(first, 1))
+    table = StreamingTable(out, headers, sampled, LINE_FORMATS[fmt])
+    table.writeHeader()
+    count = 0
+    for row in itertools.chain(sampled, numbered(itertools.chain([rest], rows), len(first) + 1)):
+        table.writeRow(row)
+        count += 1
+    table.close()
+    return count
+
+
+def _plain(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def plainRecord(record: dict) -> dict:
+    """
+    The record with NaN as None, ready for json
+    """
+    return {k: _plain(v) for k, v in record.items()}
+
+
+def writeCsv(out: IO[str], records: Iterator[dict]) -> int:
+    """
+    One row per record, list values are joined with spaces
+    """
+    writer = None
+    count = 0
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(record))
+            writer.writeheader()
+        writer.writerow({k: " ".join("" if v is None else str(v) for v in value) if isinstance(value, list) else
+                         ("" if value is None else value) for k, value in plainRecord(record).items()})
+        count += 1
+    return count
+
+
+def writeJsonl(out: IO[str], records: Iterator[dict]) -> int:
+    """
+    One json object per record, NaN written as null
+    """
+    count = 0
+    for record in records:
+        out.write(json.dumps(plainRecord(record)) + "\n")
+        count += 1
+    return count
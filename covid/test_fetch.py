@@ -0,0 +1,77 @@
+"""
+  fetch.py against a local http server standing in for github.
+
+    python -m pytest test_fetch.py
+"""
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fetch
+from fetch import Status
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    (directory served, its url)
+    """
+    directory = tmp_path / "served"
+    directory.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(directory)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield directory, F"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_downloads_then_revalidates(served, tmp_path):
+    directory, url = served
+    (directory / "confirmed.csv").write_text("a,b\n1,2\n")
+    path = tmp_path / "indata" / "confirmed.csv"
+
+    first = fetch.fetch(F"{url}/confirmed.csv", path)
+    assert first.status == Status.downloaded
+    assert path.read_text() == "a,b\n1,2\n"
+    meta = json.loads(fetch.metaPath(path).read_text())
+    assert meta["url"] == F"{url}/confirmed.csv" and meta["last_modified"]
+
+    second = fetch.fetch(F"{url}/confirmed.csv", path)
+    assert second.status == Status.notModified
+    assert path.read_text() == "a,b\n1,2\n"
+
+
+def test_failed_fetch_keeps_previous_copy(served, tmp_path):
+    directory, url = served
+    (directory / "deaths.csv").write_text("a,b\n3,4\n")
+    path = tmp_path / "indata" / "deaths.csv"
+    assert fetch.fetch(F"{url}/deaths.csv", path).ok
+
+    (directory / "deaths.csv").unlink()
+    result = fetch.fetch(F"{url}/deaths.csv", path)
+    assert result.status == Status.failed and not result.ok
+    assert "404" in result.error
+    assert path.read_text() == "a,b\n3,4\n"
+    assert [p.name for p in path.parent.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_fetch_all_keeps_the_order_of_jobs(served, tmp_path):
+    directory, url = served
+    for name in ("confirmed.csv", "deaths.csv"):
+        (directory / name).write_text(name)
+    jobs = [(F"{url}/{name}", tmp_path / name) for name in ("confirmed.csv", "missing.csv", "deaths.csv")]
+
+    results = fetch.fetchAll(jobs)
+    assert [r.path for r in results] == [path for _, path in jobs]
+    assert [r.status for r in results] == [Status.downloaded, Status.failed, Status.downloaded]
+    assert (tmp_path / "deaths.csv").read_text() == "deaths.csv"
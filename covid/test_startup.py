@@ -0,0 +1,14 @@
+"""
+  CLI startup regression test, see startupBench.py. STARTUP_BUDGET_SCALE scales the
+  budgets on slow runners.
+
+    python -m pytest test_startup.py
+"""
+import os
+
+import startupBench
+
+
+def test_startup_within_budgets():
+    results = startupBench.measure(runs=1)
+    assert startupBench.failures(results, float(os.environ.get("STARTUP_BUDGET_SCALE", 1.0))) == []
@@ -11,11 +11,14 @@
        ottawa
 """
 import logging
+from typing import List
 import typer                     # https://typer.tiangolo.com
-import getData
-import processWorld
 import click_spinner
 import report
+from config import PLOT_WORKERS, DB_DIR, DB_FORMAT, DbFormat, HISTORY, ROLLING_WINDOWS, SOURCES, SourceName
+from pathlib import Path
+
+# sources, processWorld and storage pull in requests, pandas and numpy: they are imported by the commands
 
 LOG = logging.getLogger("covid")
 
@@ -23,16 +26,58 @@ app = typer.Typer()
 
 app.add_typer(report.app, name="report")
 
-@app.command(help="Get raw covid-19 data from john hopkins")
-def load() -> None:
+@app.command(help="Get raw covid-19 data from john hopkins and the other sources")
+def load(source: List[SourceName] = typer.Option(list(SOURCES), help="Source to fetch. Can be repeated")) -> None:
+    import sources
+
     typer.echo("Loading data from website...  ", nl=False)
     with click_spinner.spinner():
-        getData.get()
-    typer.echo("   DONE ")
+        results = sources.fetchSources(sources.getSources(source))
+    if all(results.values()):
+        typer.echo("   DONE ")
+    else:
+        failed = ", ".join(name for name, ok in results.items() if not ok)
+        typer.echo(F"   FAILED {failed} (kept the previous data)")
 
 @app.command(help="Process world data creating db and plots")
-def process() -> None:
-    processWorld.process()
+def process(plots: bool = typer.Option(True, help="Render the per region plots"),
+            region: List[str] = typer.Option(None, help="Only plot this country or plot title, e.g. Canada_Ontario. Can be repeated"),
+            workers: int = typer.Option(PLOT_WORKERS, help="Number of processes used to render the plots"),
+            full: bool = typer.Option(False, help="Ignore the previous run and recompute every region"),
+            db_format: DbFormat = typer.Option(DB_FORMAT, help="Format of the database written"),
+            window: List[int] = typer.Option(list(ROLLING_WINDOWS), help="Window in days of a precomputed rolling average of new cases. Can be repeated"),
+            source: List[SourceName] = typer.Option(list(SOURCES), help="Source merged into the database. Can be repeated"),
+            thumbnails: bool = typer.Option(False, help="Also write low resolution copies of the plots for web galleries"),
+            page_size: int = typer.Option(0, help="Draw the regions as small multiples, this many per image, instead of one plot each"),
+            history: bool = typer.Option(HISTORY, help="Also add the changed values as a snapshot to the sqlite history")) -> None:
+    import processWorld
+
+    processWorld.process(plots=plots, regions=region, workers=workers, full=full, dbFormat=db_format, windows=window,
+                         sourceNames=source, thumbnails=thumbnails, pageSize=page_size, history=history)
+
+@app.command(help="Export the processed database as json")
+def export(file: Path = typer.Option(None, file_okay=True, resolve_path=True, help="Output file. Defaults to db.json in the db directory")) -> None:
+    import storage
+
+    backend = storage.findBackend(DB_DIR)
+    if backend is None:
+        typer.echo(F"No database found in {DB_DIR}. Run process first")
+        raise typer.Exit(1)
+
+    target = storage.JsonBackend(DB_DIR) if file is None else storage.JsonBackend(file.parent, file.name)
+    written = target.write(backend.read())
+    typer.echo(F"Exported {written} bytes to {target.path}")
+
+@app.command(help="List the snapshots of the sqlite history")
+def snapshots() -> None:
+    import storage
+    from tabulate import tabulate    # https://pypi.org/project/tabulate/
+
+    backend = storage.SqliteBackend(DB_DIR)
+    if not backend.exists():
+        typer.echo(F"No history in {DB_DIR}. Run: covid world process --history")
+        raise typer.Exit(1)
+    typer.echo(tabulate(backend.snapshots(), headers="keys"))
 
 # This is the main application: add CLI Parameters for the main CLI Application her
 @app.callback()